@@ -4,14 +4,45 @@ from __future__ import annotations
 
 import logging
 
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import Platform
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers import device_registry as dr, entity_registry as er
+from homeassistant.const import EVENT_HOMEASSISTANT_STOP, Platform
+from homeassistant.core import Event, HomeAssistant, ServiceCall
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import (
+    config_validation as cv,
+    device_registry as dr,
+    entity_registry as er,
+)
 from homeassistant.helpers.device_registry import DeviceEntry, DeviceInfo
+from homeassistant.helpers.typing import ConfigType
 
-from .const import DOMAIN
-from .coordinator import NMConnection, newCoordinator
+from .const import (
+    ATTR_COUNT,
+    ATTR_ENTRY_ID,
+    ATTR_TIMEOUT,
+    CONF_LONGPOLL_WAIT,
+    CONF_TRANSPORT,
+    DEFAULT_LONGPOLL_WAIT,
+    DOMAIN,
+    SERVICE_PROFILE,
+    TRANSPORT_LONGPOLL,
+    TRANSPORT_POLL,
+    TRANSPORT_WEBSOCKET,
+)
+from .coordinator import (
+    NMConnection,
+    NMDeviceCoordinator,
+    async_run_longpoll,
+    async_run_websocket,
+    async_track_poll_groups,
+    entry_conf,
+    newCoordinator,
+)
+from .mediation import close_connection
+from .profiler import NMProfileSession
+from .spec_cache import async_remove_cached, async_revalidate
 
 PLATFORMS: list[Platform] = [
     Platform.BINARY_SENSOR,
@@ -25,6 +56,63 @@ PLATFORMS: list[Platform] = [
 
 _LOGGER = logging.getLogger(__name__)
 
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_COUNT, default=5): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=1000)
+        ),
+        vol.Optional(ATTR_TIMEOUT, default=600): vol.All(
+            vol.Coerce(int), vol.Range(min=1, max=86400)
+        ),
+    }
+)
+
+
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Register integration's services."""
+
+    async def _async_profile(call: ServiceCall) -> None:
+        """Profile next refreshes of the device or all devices, see profiler.py."""
+        coordinators: dict[str, NMDeviceCoordinator] = hass.data.get(DOMAIN, {})
+        if ATTR_ENTRY_ID in call.data:
+            entryId = call.data[ATTR_ENTRY_ID]
+            if entryId not in coordinators:
+                raise HomeAssistantError(f"NodeMCU device {entryId} is not loaded")
+            selected = {entryId: coordinators[entryId]}
+        else:
+            selected = dict(coordinators)
+        if not selected:
+            raise HomeAssistantError("No NodeMCU device is loaded")
+        if any(c.profiler is not None for c in coordinators.values()):
+            raise HomeAssistantError("NodeMCU profiling is already running")
+
+        session = NMProfileSession(hass, list(selected), call.data[ATTR_COUNT])
+        try:
+            session.async_start()
+        except ValueError as ex:
+            # cProfile allows one active profiler, e.g. HomeAssistant's own
+            raise HomeAssistantError(f"NodeMCU profiling cannot start: {ex}") from ex
+        for c in selected.values():
+            c.profiler = session
+
+        async def _run() -> None:
+            try:
+                paths = await session.async_run(call.data[ATTR_TIMEOUT])
+            finally:
+                for c in selected.values():
+                    c.profiler = None
+            _LOGGER.warning("NodeMCU profile written to %s", ", ".join(map(str, paths)))
+
+        hass.async_create_background_task(_run(), f"{DOMAIN} profile")
+
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, _async_profile, schema=PROFILE_SCHEMA
+    )
+    return True
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up a single NodeMCU device from a config entry."""
@@ -46,36 +134,113 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # store the coordinator in hass domain
     hass.data[DOMAIN][entry.entry_id] = deviceCoordinator
 
+    # apply changed options by reloading the device
+    entry.async_on_unload(entry.add_update_listener(_async_update_listener))
+
+    # release device's pooled http sockets when hass stops
+    async def _closeConnection(_: Event) -> None:
+        await close_connection(deviceCoordinator.conn)
+
+    entry.async_on_unload(
+        hass.bus.async_listen_once(EVENT_HOMEASSISTANT_STOP, _closeConnection)
+    )
+
     # pre-create device info object, to be used by all device entries
     deviceCoordinator.device_info = doSetupDeviceInfo(
         entry, deviceCoordinator.conn, deviceCoordinator.read_device_info
     )
     _LOGGER.debug("Device info: %s", deviceCoordinator.device_info)
+    # hub's child devices, linked to the hub device
+    deviceCoordinator.child_device_infos = {
+        child: doSetupChildDeviceInfo(entry, deviceCoordinator.conn, child, childInfo)
+        for child, childInfo in deviceCoordinator.read_device_info.get(
+            "children", {}
+        ).items()
+    }
 
     # do register DeviceEntry for this connector to act as hass device for all entries
     deviceCoordinator.device_entry = doSetupDevice(
         hass, entry.entry_id, deviceCoordinator.device_info
     )
+    # hub's children the hub no longer reports
+    doRemoveStaleChildDevices(
+        hass,
+        entry,
+        {
+            identifier
+            for info in deviceCoordinator.child_device_infos.values()
+            for identifier in info.get("identifiers", ())
+        },
+    )
 
-    # first data load from the endpoint before continuing with entities setup
-    await deviceCoordinator.async_config_entry_first_refresh()
+    if deviceCoordinator.spec_from_cache:
+        # entities are known from the cache, do not hold the start-up if device is slow
+        # or offline. Entities stay unavailable until the device answers.
+        await deviceCoordinator.async_refresh()
+    else:
+        # first data load from the endpoint before continuing with entities setup
+        await deviceCoordinator.async_config_entry_first_refresh()
     # setup all device entities (form /spec)
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
+    transport = entry_conf(entry, CONF_TRANSPORT, TRANSPORT_POLL)
+    if transport == TRANSPORT_POLL:
+        for unsub in async_track_poll_groups(deviceCoordinator):
+            entry.async_on_unload(unsub)
+    elif transport == TRANSPORT_WEBSOCKET:
+        entry.async_create_background_task(
+            hass,
+            async_run_websocket(deviceCoordinator),
+            f"{DOMAIN} websocket {entry.title}",
+        )
+    elif transport == TRANSPORT_LONGPOLL:
+        entry.async_create_background_task(
+            hass,
+            async_run_longpoll(
+                deviceCoordinator,
+                entry_conf(entry, CONF_LONGPOLL_WAIT, DEFAULT_LONGPOLL_WAIT),
+            ),
+            f"{DOMAIN} long-poll {entry.title}",
+        )
+
+    if deviceCoordinator.spec_from_cache:
+        entry.async_create_background_task(
+            hass,
+            async_revalidate(
+                hass,
+                _LOGGER,
+                entry,
+                deviceCoordinator.conn,
+                deviceCoordinator.read_device_info,
+                deviceCoordinator.raw_device_spec,
+            ),
+            f"{DOMAIN} revalidate spec {entry.title}",
+        )
+
     # await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
 
     return True
 
 
+async def _async_update_listener(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the device after its options have changed."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     if unload_ok := await hass.config_entries.async_unload_platforms(entry, PLATFORMS):
-        hass.data[DOMAIN].pop(entry.entry_id)
-        doUnloadDevice(hass, entry)
+        deviceCoordinator = hass.data[DOMAIN].pop(entry.entry_id)
+        await close_connection(deviceCoordinator.conn)
 
     return unload_ok
 
 
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Drop persistent data of removed device."""
+    await async_remove_cached(hass, entry)
+
+
 def doSetupDeviceInfo(
     entry: ConfigEntry, conn: NMConnection, read_device_info: dict[str, str]
 ) -> DeviceInfo:
@@ -98,6 +263,22 @@ def doSetupDeviceInfo(
     )
 
 
+def doSetupChildDeviceInfo(
+    entry: ConfigEntry, conn: NMConnection, child: str, read_device_info: dict[str, str]
+) -> DeviceInfo:
+    """Create DeviceInfo of hub's child device."""
+    return DeviceInfo(
+        configuration_url=conn.url_base,
+        identifiers={(DOMAIN, f"{entry.unique_id} {child}")},
+        manufacturer=read_device_info.get("manufacturer"),
+        model=read_device_info.get("model"),
+        name=f"{child} {read_device_info.get('name', '')}".strip(),
+        sw_version=read_device_info.get("swVersion"),
+        hw_version=read_device_info.get("hwVersion"),
+        via_device=(DOMAIN, str(entry.unique_id)),
+    )
+
+
 def doSetupDevice(hass: HomeAssistant, entryId: str, dInfo: DeviceInfo) -> DeviceEntry:
     """Register the config-entry as device info."""
     return dr.async_get(hass).async_get_or_create(
@@ -118,22 +299,26 @@ def doSetupDevice(hass: HomeAssistant, entryId: str, dInfo: DeviceInfo) -> Devic
     )
 
 
-def doUnloadDevice(hass: HomeAssistant, entry: ConfigEntry) -> None:
-    """Remove devices that are no longer tracked."""
-    router_id = None
+def doRemoveStaleChildDevices(
+    hass: HomeAssistant, entry: ConfigEntry, childIdentifiers: set[tuple[str, str]]
+) -> None:
+    """Remove child devices, and their entities, the hub no longer reports.
+
+    Runs on set up, so reloads keep the children present and their entities'
+    customizations and history.
+    """
     device_registry = dr.async_get(hass)
+    entity_registry = er.async_get(hass)
     devices = dr.async_entries_for_config_entry(device_registry, entry.entry_id)
     for device_entry in devices:
         if device_entry.via_device_id is None:
-            router_id = device_entry.id
-            continue  # do not remove the router itself
+            continue  # do not remove the hub itself
+        if device_entry.identifiers & childIdentifiers:
+            continue
+        for entity_entry in er.async_entries_for_device(
+            entity_registry, device_entry.id, include_disabled_entities=True
+        ):
+            entity_registry.async_remove(entity_entry.entity_id)
         device_registry.async_update_device(
             device_entry.id, remove_config_entry_id=entry.entry_id
         )
-
-    # Remove entities that are no longer tracked
-    entity_registry = er.async_get(hass)
-    entries = er.async_entries_for_config_entry(entity_registry, entry.entry_id)
-    for entity_entry in entries:
-        if entity_entry.device_id is not router_id:
-            entity_registry.async_remove(entity_entry.entity_id)
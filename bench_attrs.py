@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+
+# Micro-benchmark comparing reflective dict_to_attr and int_to_enum, as these were
+# before compiled mappers, with compiled utils.AttrMapper and memoized int_to_enum.
+# Uses light and climate data from test_data.py on a large device.
+# Run it from this folder: python3 bench_attrs.py [--entities N]
+
+import argparse
+from enum import IntFlag
+import timeit
+from typing import Any
+
+import test_data
+from utils import dict_to_attr
+
+# Entity-like classes, with attributes the way HomeAssistant entities declare them
+
+
+class Feature(IntFlag):  # noqa: D101
+    A = 1
+    B = 2
+    C = 4
+    D = 8
+    E = 16
+    F = 32
+    G = 64
+    H = 128
+
+
+class Entity:  # noqa: D101
+    _attr_name: str | None = None
+    _attr_available: bool = True
+    _attr_supported_features: Feature | None = None
+    _attr_rgbww_color: tuple[int, int, int, int, int] = (0, 0, 0, 0, 0)
+
+    enum_attrs = {"supported_features": Feature}
+
+
+def reflectiveIntToEnum(integer_value: int, enums: type[IntFlag]) -> Any:  # noqa: D103
+    ret = 0
+    for flag in enums:
+        if integer_value & flag.value:
+            ret = flag | ret
+    return ret
+
+
+def reflectiveDictToAttr(obj: Any, data: dict[str, Any]) -> Any:  # noqa: D103
+    for k, v in data.items():
+        attr_name = f"_attr_{k}"
+        if hasattr(obj, attr_name):
+            if isinstance(getattr(obj, attr_name), tuple):
+                v = {"__tuple__": True, "items": v}
+        setattr(obj, k, v)
+    return obj
+
+
+def oldUpdate(e: Entity, tbl: dict[str, Any]) -> None:
+    """Former on_update with int_to_enum, followed by dict_to_attr."""
+    if tbl.get("supported_features") is not None:
+        f = reflectiveIntToEnum(tbl["supported_features"], Feature)
+        tbl = {**tbl, "supported_features": f}
+    reflectiveDictToAttr(e, tbl)
+
+
+def newUpdate(e: Entity, tbl: dict[str, Any]) -> None:  # noqa: D103
+    dict_to_attr(e, tbl, e.enum_attrs)
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description="AttrMapper benchmark")
+    parser.add_argument("--entities", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=10)
+    args = parser.parse_args()
+
+    templates = [
+        test_data.DummyDeviceData["lightD6"],
+        test_data.DummyDeviceData["thermostat1"],
+    ]
+    tbls = [templates[i % len(templates)] for i in range(args.entities)]
+    entities = [Entity() for _ in tbls]
+    pairs = list(zip(entities, tbls, strict=True))
+    print(f"entities={len(pairs)} (light and climate)")
+
+    results = {}
+    for label, fnc in (("reflective", oldUpdate), ("compiled", newUpdate)):
+        best = min(
+            timeit.repeat(
+                lambda f=fnc: [f(e, t) for e, t in pairs],
+                repeat=args.repeat,
+                number=args.number,
+            )
+        )
+        results[label] = best / (args.number * len(pairs)) * 1e9
+        print(f"{label:<12} {results[label]:10.1f} ns/entity")
+    print(f"{'speedup':<12} {results['reflective'] / results['compiled']:10.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+# Benchmark of entity update hot path, from new DeviceData to entity's state.
+# Generates synthetic DeviceSpec/DeviceData in the shape of test_data.py,
+# entities spread evenly across all seven platforms, and times a refresh
+# where some share of entities' values has changed (--changed, all by default),
+# the way a poll delivers it:
+# coordinator.async_update_listeners -> _handle_coordinator_update ->
+# KeyPath.get -> on_update -> dict_to_attr -> async_write_ha_state
+# State writes are stubbed, computing entity's state without the state machine.
+#
+# Requires HomeAssistant installed, run it from this folder:
+#   python3 bench_entities.py [--sizes 10,100,1000,5000] [--changed 0.1]
+# Results saved with --json can be compared with a later run:
+#   python3 bench_entities.py --compare out.json
+
+import argparse
+import importlib
+import json
+from functools import partial
+from pathlib import Path
+import subprocess
+import sys
+import time
+import tracemalloc
+from types import SimpleNamespace
+from typing import Any
+
+import test_data
+from test_devices import buildDevice, mutated
+
+# the integration is imported as a package, named after this folder
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+pkgName = Path(__file__).resolve().parent.name
+
+# number of entity state writes done, by stubbed async_write_ha_state
+stateWrites = 0
+
+
+def writeState(e: Any) -> None:
+    """Stub of async_write_ha_state, computing the state and its attributes."""
+    global stateWrites  # noqa: PLW0603
+    stateWrites += 1
+    _ = e.state
+    _ = e.extra_state_attributes
+
+
+def newEntities(spec: dict[str, Any], data: dict[str, Any]) -> tuple[Any, list[Any]]:
+    """Create entities of all platforms, listening to the device's coordinator.
+
+    The coordinator is the integration's one, with only the attributes
+    its listener dispatch and the entities need.
+    """
+    coordinatorModule = importlib.import_module(f"{pkgName}.coordinator")
+    telemetryModule = importlib.import_module(f"{pkgName}.telemetry")
+    cls = coordinatorModule.NMDeviceCoordinator
+    coordinator = cls.__new__(cls)
+    coordinator.__dict__.update(
+        name="bench",
+        data=data,
+        last_update_success=True,
+        profiler=None,
+        _listeners={},
+        _diagnostic_listeners=[],
+        conn=SimpleNamespace(hostname="bench", telemetry=telemetryModule.NMTelemetry()),
+        conf_entry=SimpleNamespace(unique_id="bench"),
+        read_device_info=test_data.DummyDeviceInfo,
+        device_info={},
+        child_device_infos={},
+        spec_options={},
+        optimistic_platforms=[],
+    )
+    entities = []
+    for platform, entries in spec.items():
+        module = importlib.import_module(f"{pkgName}.{platform}")
+        newEntity = module._newEntity  # noqa: SLF001
+        entities.extend(newEntity(coordinator, s) for s in entries)
+    for e in entities:
+        # what CoordinatorEntity.async_added_to_hass registers
+        coordinator._listeners[id(e)] = (  # noqa: SLF001
+            e._handle_coordinator_update,  # noqa: SLF001
+            e.coordinator_context,
+        )
+        e.async_write_ha_state = partial(writeState, e)
+    # first dispatch notifies all entities
+    coordinator.async_update_listeners()
+    return coordinator, entities
+
+
+def refresh(coordinator: Any, data: dict[str, Any]) -> None:
+    """Apply new data to the coordinator and notify its entities, as a poll would."""
+    coordinator.data = data
+    coordinator.async_update_listeners()
+
+
+def benchSize(entities: int, rounds: int, changed: float) -> dict[str, Any]:
+    """Measure refresh of single device with given number of entities."""
+    spec, data = buildDevice(entities)
+    coordinator, ents = newEntities(spec, data)
+    # each round changes data of the previous one
+    variants = [data]
+    for r in range(rounds + 2):
+        variants.append(mutated(spec, variants[-1], r + 1, changed))
+
+    # warm-up, then best of the rounds as latency
+    refresh(coordinator, variants[1])
+    writesBefore = stateWrites
+    times = []
+    for v in variants[2:-1]:
+        start = time.perf_counter()
+        refresh(coordinator, v)
+        times.append(time.perf_counter() - start)
+    writes = (stateWrites - writesBefore) / len(times)
+    times.sort()
+
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    refresh(coordinator, variants[-1])
+    after = tracemalloc.take_snapshot()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    stats = after.compare_to(before, "filename")
+    allocated = sum(s.count_diff for s in stats if s.count_diff > 0)
+
+    return {
+        "entities": len(ents),
+        "changed": changed,
+        "writes": writes,
+        "latency_ms": times[0] * 1e3,
+        "median_ms": times[len(times) // 2] * 1e3,
+        "per_entity_us": times[0] / len(ents) * 1e6,
+        "alloc_blocks": allocated,
+        "alloc_peak_kb": peak / 1024,
+    }
+
+
+def gitRevision() -> str | None:  # noqa: D103
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def printResults(results: list[dict[str, Any]], baseline: dict[int, Any]) -> None:
+    """Print results table, with ratio to baseline if given."""
+    print(
+        f"{'entities':>8} {'writes':>7} {'latency ms':>11} {'median ms':>10}"
+        f" {'us/entity':>10}"
+        f" {'alloc blocks':>12} {'peak KB':>9}"
+        + (f" {'vs baseline':>11}" if baseline else "")
+    )
+    for r in results:
+        line = (
+            f"{r['entities']:>8} {r['writes']:>7.0f} {r['latency_ms']:>11.3f}"
+            f" {r['median_ms']:>10.3f}"
+            f" {r['per_entity_us']:>10.2f} {r['alloc_blocks']:>12}"
+            f" {r['alloc_peak_kb']:>9.1f}"
+        )
+        if (b := baseline.get(r["entities"])) is not None:
+            line += f" {b['latency_ms'] / r['latency_ms']:>10.2f}x"
+        print(line)
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description="Entity update hot path benchmark")
+    parser.add_argument("--sizes", default="10,100,1000,5000")
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument(
+        "--changed", type=float, default=1, help="share of entities changed per poll"
+    )
+    parser.add_argument("--json", help="save results to this file")
+    parser.add_argument("--compare", help="compare with results saved by --json")
+    args = parser.parse_args()
+
+    baseline: dict[int, Any] = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            saved = json.load(f)
+        baseline = {r["entities"]: r for r in saved["results"]}
+        print(f"baseline: {args.compare} (revision {saved.get('revision')})")
+
+    sizes = [int(s) for s in args.sizes.split(",")]
+    results = [benchSize(n, max(args.rounds, 1), args.changed) for n in sizes]
+    printResults(results, baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "revision": gitRevision(),
+                    "python": sys.version.split()[0],
+                    "rounds": args.rounds,
+                    "changed": args.changed,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
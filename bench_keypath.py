@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+
+# Micro-benchmark comparing utils.deep_get/deepdict with compiled utils.KeyPath.
+# Run it from this folder: python3 bench_keypath.py [--entities N] [--depth D]
+
+import argparse
+import timeit
+from typing import Any
+
+from utils import KeyPath, deep_get, deepdict
+
+
+def buildPayload(entities: int, depth: int) -> tuple[dict[str, Any], list[str]]:
+    """Build nested DeviceData-like payload and list of keys pointing to its leaves."""
+    data: dict[str, Any] = {}
+    keys: list[str] = []
+    for i in range(entities):
+        path = [f"grp{i % 7}"] + [f"lvl{d}_{i % 13}" for d in range(depth - 2)]
+        path.append(f"ent{i}")
+        d = data
+        for k in path[:-1]:
+            d = d.setdefault(k, {})
+        d[path[-1]] = {"native_value": i, "is_on": bool(i % 2)}
+        keys.append(".".join(path))
+    return data, keys
+
+
+def bench(label: str, fnc: Any, repeat: int, number: int, ops: int) -> float:
+    """Print best per-operation time in nanoseconds."""
+    best = min(timeit.repeat(fnc, repeat=repeat, number=number))
+    perOp = best / (number * ops) * 1e9
+    print(f"{label:<28} {perOp:10.1f} ns/op")
+    return perOp
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description="KeyPath vs deep_get benchmark")
+    parser.add_argument("--entities", type=int, default=5000)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    data, keys = buildPayload(args.entities, max(args.depth, 2))
+    paths = [KeyPath(k) for k in keys]
+    ops = len(keys)
+    print(f"entities={ops} depth={args.depth}")
+
+    old = bench(
+        "deep_get",
+        lambda: [deep_get(data, k, {}) for k in keys],
+        args.repeat,
+        args.number,
+        ops,
+    )
+    new = bench(
+        "KeyPath.get",
+        lambda: [p.get(data, {}) for p in paths],
+        args.repeat,
+        args.number,
+        ops,
+    )
+    print(f"{'read speedup':<28} {old / new:10.2f}x")
+
+    old = bench(
+        "deepdict",
+        lambda: [deepdict(k, {"is_on": True}) for k in keys],
+        args.repeat,
+        args.number,
+        ops,
+    )
+    new = bench(
+        "KeyPath.delta",
+        lambda: [p.delta({"is_on": True}) for p in paths],
+        args.repeat,
+        args.number,
+        ops,
+    )
+    print(f"{'write speedup':<28} {old / new:10.2f}x")
+
+    bench(
+        "KeyPath compile (once)",
+        lambda: [KeyPath(k) for k in keys],
+        args.repeat,
+        1,
+        ops,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Per-device circuit breaker and retry budget, used by the mediation."""
+
+import random
+import time
+from typing import Final
+
+# circuit breaker states
+STATE_CLOSED: Final = "closed"
+STATE_OPEN: Final = "open"
+STATE_HALF_OPEN: Final = "half_open"
+
+
+class NMCircuitBreaker:
+    """Fail fast while the device is known to be down.
+
+    Opens after a number of consecutive failed requests. While open, requests
+    fail immediately. Once the cooldown passes, single probe request is let
+    through (half-open): success closes the breaker, failure re-opens it
+    with doubled cooldown.
+    """
+
+    # consecutive failures opening the breaker
+    threshold: int
+    # seconds the breaker stays open, before letting a probe through
+    cooldown_min: float
+    cooldown_max: float
+
+    state: str
+    failures: int
+    cooldown: float
+    # monotonic time when open breaker lets a probe through
+    open_until: float
+
+    def __init__(
+        self, threshold: int = 5, cooldown_min: float = 30, cooldown_max: float = 600
+    ) -> None:
+        """Initialize closed breaker."""
+        self.threshold = threshold
+        self.cooldown_min = cooldown_min
+        self.cooldown_max = cooldown_max
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.cooldown = cooldown_min
+        self.open_until = 0
+
+    def allow(self) -> bool:
+        """Check if a request can be sent now, turning open breaker to half-open."""
+        if self.state == STATE_CLOSED:
+            return True
+        now = time.monotonic()
+        if now >= self.open_until:
+            # let single probe through, another one only if it never finishes
+            self.state = STATE_HALF_OPEN
+            self.open_until = now + self.cooldown
+            return True
+        return False
+
+    def success(self) -> None:
+        """Record device answering, closes the breaker."""
+        self.state = STATE_CLOSED
+        self.failures = 0
+        self.cooldown = self.cooldown_min
+
+    def failure(self) -> None:
+        """Record failed request, may open the breaker."""
+        self.failures += 1
+        if self.state == STATE_HALF_OPEN:
+            # probe failed, stay open longer
+            self.cooldown = min(self.cooldown * 2, self.cooldown_max)
+            self._open()
+        elif self.failures >= self.threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.state = STATE_OPEN
+        self.open_until = time.monotonic() + self.cooldown
+
+
+class NMRetryBudget:
+    """Limit retries to a fraction of successful requests.
+
+    Each retry spends one token, each successful request earns ratio of a token.
+    While the device keeps failing, the budget drains and requests are not retried.
+    """
+
+    tokens: float
+    max_tokens: float
+    ratio: float
+
+    def __init__(self, max_tokens: float = 10, ratio: float = 0.1) -> None:
+        """Initialize full budget."""
+        self.max_tokens = max_tokens
+        self.ratio = ratio
+        self.tokens = max_tokens
+
+    def withdraw(self) -> bool:
+        """Spend one token for a retry, False if the budget is exhausted."""
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def deposit(self) -> None:
+        """Earn for successful request."""
+        self.tokens = min(self.tokens + self.ratio, self.max_tokens)
+
+
+def backoff(attempt: int, base: float = 0.25, cap: float = 5) -> float:
+    """Seconds to wait before retry attempt, exponential with full jitter."""
+    return random.uniform(0, min(cap, base * 2**attempt))
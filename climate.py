@@ -1,6 +1,7 @@
 """The module contains the NMEntityClimate class and related functions for integrating NodeMCU climate devices with Home Assistant."""
 
-from typing import Any
+from enum import IntFlag
+from typing import Any, ClassVar
 
 from homeassistant.components.climate import (
     ATTR_TARGET_TEMP_HIGH,
@@ -19,12 +20,15 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from .const import DOMAIN
 from .coordinator import NMDeviceCoordinator
 from .entity import NMBaseEntity, instrument_update, send_state
-from .utils import int_to_enum
 
 
 class NMEntityClimate(NMBaseEntity, ClimateEntity):
     """Representation of a NodeMCU sensor."""
 
+    enum_attrs: ClassVar[dict[str, type[IntFlag]]] = {
+        "supported_features": ClimateEntityFeature
+    }
+
     async def async_set_temperature(self, **kwargs: Any) -> None:  # noqa: D102
         o: dict[str, Any] = {}
         if t := kwargs.get(ATTR_TEMPERATURE):
@@ -67,9 +71,7 @@ class NMEntityClimate(NMBaseEntity, ClimateEntity):
     def on_update(self, tbl: dict[str, Any]) -> dict[str, Any]:  # noqa: D102
         # force on/off as these are coded for all types
         e = ClimateEntityFeature.TURN_ON | ClimateEntityFeature.TURN_OFF
-        if tbl.get("supported_features"):
-            e = e | int_to_enum(tbl["supported_features"], ClimateEntityFeature)
-        return {**tbl, "supported_features": e}
+        return {**tbl, "supported_features": (tbl.get("supported_features") or 0) | e}
 
 
 def _newEntity(
@@ -0,0 +1,71 @@
+"""Encoding of payloads exchanged with the device, negotiated via Accept/Content-Type.
+
+Json is always supported. Compact binary encodings (MessagePack, CBOR) are
+offered to the device only if their python library is installed.
+MessagePack is preferred, it decodes fastest.
+"""
+
+from collections.abc import Callable, Mapping
+import json
+from typing import Any, Final
+
+try:
+    import cbor2
+except ImportError:  # pragma: no cover
+    cbor2 = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+CONTENT_JSON: Final = "application/json"
+CONTENT_CBOR: Final = "application/cbor"
+CONTENT_MSGPACK: Final = "application/msgpack"
+
+# alternative media types devices may use for MessagePack
+_aliases: Final = {
+    "application/x-msgpack": CONTENT_MSGPACK,
+    "application/vnd.msgpack": CONTENT_MSGPACK,
+}
+
+# (decode, encode) per supported media type, most preferred first
+_codecs: dict[str, tuple[Callable[[bytes], Any], Callable[[Any], bytes]]] = {}
+if msgpack is not None:
+    _codecs[CONTENT_MSGPACK] = (msgpack.unpackb, msgpack.packb)
+if cbor2 is not None:
+    _codecs[CONTENT_CBOR] = (cbor2.loads, cbor2.dumps)
+_codecs[CONTENT_JSON] = (json.loads, lambda data: json.dumps(data).encode())
+
+# Accept header sent with each GET, json is the least preferred fallback
+ACCEPT: Final = ", ".join(
+    f"{mime};q={1 - i / 10:.1f}" if i else mime for i, mime in enumerate(_codecs)
+)
+
+
+def media_type(headers: Mapping[str, str]) -> str:
+    """Return supported media type of the response, json if unknown or missing."""
+    mime = headers.get("Content-Type", "").split(";", 1)[0].strip().lower()
+    mime = _aliases.get(mime, mime)
+    return mime if mime in _codecs else CONTENT_JSON
+
+
+def decode(mime: str, body: bytes) -> Any:
+    """Decode response body of given media type, None if the body is empty.
+
+    Raises ValueError if the body cannot be decoded.
+    """
+    if mime == CONTENT_JSON:
+        return json.loads(body) if body.strip() else None
+    if not body:
+        return None
+    try:
+        return _codecs[mime][0](body)
+    except Exception as ex:  # noqa: BLE001
+        # each library raises its own decode errors
+        raise ValueError(f"invalid {mime} payload: {ex}") from ex
+
+
+def encode(mime: str, data: Any) -> bytes:
+    """Encode request body in given media type."""
+    return _codecs.get(mime, _codecs[CONTENT_JSON])[1](data)
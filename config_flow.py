@@ -2,58 +2,229 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Any
+from typing import Any, Final
 
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.data_entry_flow import FlowResultType
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.service_info.zeroconf import ZeroconfServiceInfo
 
 from .const import (
+    CONF_ADAPTIVE,
     CONF_APIPATH,
+    CONF_CONFIRM_ALL,
     CONF_HOST,
+    CONF_LONGPOLL_WAIT,
+    CONF_OPTIMISTIC,
     CONF_PERIOD,
+    CONF_PERIOD_FAST,
+    CONF_PERIOD_MAX,
+    CONF_PERIOD_MIN,
+    CONF_PERIOD_SLOW,
     CONF_PORT,
+    CONF_PROBE,
     CONF_PROTOCOL,
     CONF_PWD,
+    CONF_RETRIES,
+    CONF_TIMEOUT_CONNECT,
+    CONF_TIMEOUT_READ,
+    CONF_TRANSPORT,
     CONF_USR,
+    CONF_WRITE_WINDOW,
+    DEFAULT_APIPATH,
+    DEFAULT_LONGPOLL_WAIT,
+    DEFAULT_PERIOD,
+    DEFAULT_PERIOD_FAST,
+    DEFAULT_PERIOD_MAX,
+    DEFAULT_PERIOD_MIN,
+    DEFAULT_PERIOD_SLOW,
+    DEFAULT_PORT,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT_CONNECT,
+    DEFAULT_TIMEOUT_READ,
+    DEFAULT_WRITE_WINDOW,
     DOMAIN,
+    OPTIMISTIC_PLATFORMS,
+    TRANSPORT_POLL,
+    TRANSPORTS,
     CannotConnect,
     InvalidAuth,
+    NodeMCUDeviceException,
 )
-from .mediation import newNMConnection
+from .mediation import close_connection, newNMConnection, read_device_info
+from .tuning import NMProbeResult, describe, probe_device, recommend
 
 _LOGGER = logging.getLogger(__name__)
 
+# devices probed at once, while many discovered devices are validated concurrently
+PROBE_CONCURRENCY: Final = 10
+_probeSlots = asyncio.Semaphore(PROBE_CONCURRENCY)
+
 # TODO adjust the data schema to the data that you need
 STEP_USER_DATA_SCHEMA = vol.Schema(
     {
         vol.Required(CONF_HOST, description={"suggested_value": "host.domain"}): str,
-        vol.Required(CONF_PORT, default=80): int,
+        vol.Required(CONF_PORT, default=DEFAULT_PORT): int,
         vol.Optional(CONF_USR): str,
         vol.Optional(CONF_PWD): str,
         vol.Required(
-            CONF_PERIOD, default=300, description="Polling period in sec."
+            CONF_PERIOD, default=DEFAULT_PERIOD, description="Polling period in sec."
         ): int,
         vol.Required(
-            CONF_APIPATH, default="/api/ha", description="API endpoint path"
+            CONF_APIPATH, default=DEFAULT_APIPATH, description="API endpoint path"
         ): str,
         vol.Required(CONF_PROTOCOL, default="http", description="HTTP protocol"): str,
     }
 )
 
+OPTIONS_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_PERIOD, description="Polling period in sec."): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Required(
+            CONF_ADAPTIVE,
+            default=False,
+            description="Adapt polling period to data change rate and failures",
+        ): bool,
+        vol.Required(
+            CONF_PERIOD_MIN,
+            default=DEFAULT_PERIOD_MIN,
+            description="Shortest adaptive polling period in sec.",
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_PERIOD_MAX,
+            default=DEFAULT_PERIOD_MAX,
+            description="Longest adaptive polling period in sec.",
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_PERIOD_FAST,
+            default=DEFAULT_PERIOD_FAST,
+            description="Polling period in sec. of entities in fast poll group",
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_PERIOD_SLOW,
+            default=DEFAULT_PERIOD_SLOW,
+            description="Polling period in sec. of entities in slow poll group",
+        ): vol.All(vol.Coerce(int), vol.Range(min=1)),
+        vol.Required(
+            CONF_TIMEOUT_CONNECT,
+            default=DEFAULT_TIMEOUT_CONNECT,
+            description="Seconds to wait for the device to accept connection",
+        ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+        vol.Required(
+            CONF_TIMEOUT_READ,
+            default=DEFAULT_TIMEOUT_READ,
+            description="Seconds to wait for the device to answer",
+        ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+        vol.Required(
+            CONF_RETRIES,
+            default=DEFAULT_RETRIES,
+            description="Retries of failed request",
+        ): vol.All(vol.Coerce(int), vol.Range(min=0, max=10)),
+        vol.Required(
+            CONF_WRITE_WINDOW,
+            default=DEFAULT_WRITE_WINDOW,
+            description="Seconds to batch concurrent writes into single request",
+        ): vol.All(vol.Coerce(float), vol.Range(min=0, max=5)),
+        vol.Optional(
+            CONF_OPTIMISTIC,
+            default=[],
+            description="Platforms applying written values without device refresh",
+        ): cv.multi_select({p: p for p in OPTIMISTIC_PLATFORMS}),
+        vol.Required(
+            CONF_TRANSPORT,
+            default=TRANSPORT_POLL,
+            description="How device data changes are received",
+        ): vol.In(TRANSPORTS),
+        vol.Required(
+            CONF_LONGPOLL_WAIT,
+            default=DEFAULT_LONGPOLL_WAIT,
+            description="Seconds the device may hold long-poll request",
+        ): vol.All(vol.Coerce(int), vol.Range(min=1, max=280)),
+    }
+)
+
+
+STEP_TUNE_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_PERIOD, description="Polling period in sec."): vol.All(
+            vol.Coerce(int), vol.Range(min=1)
+        ),
+        vol.Required(
+            CONF_TIMEOUT_CONNECT,
+            description="Seconds to wait for the device to accept connection",
+        ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+        vol.Required(
+            CONF_TIMEOUT_READ,
+            description="Seconds to wait for the device to answer",
+        ): vol.All(vol.Coerce(float), vol.Range(min=0.1)),
+    }
+)
+
+STEP_ZEROCONF_CONFIRM_SCHEMA = vol.Schema(
+    {
+        vol.Required(
+            CONF_CONFIRM_ALL,
+            default=False,
+            description="Add all other discovered devices as well",
+        ): bool,
+    }
+)
+
+STEP_ZEROCONF_AUTH_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_USR): str,
+        vol.Required(CONF_PWD): str,
+    }
+)
+
+# options form, with a tick to measure the device and recommend period and timeouts
+OPTIONS_PROBE_SCHEMA = OPTIONS_SCHEMA.extend(
+    {
+        vol.Optional(
+            CONF_PROBE,
+            default=False,
+            description="Measure round-trips, recommending period and timeouts",
+        ): bool,
+    }
+)
+
 
 class NodeMCUDeviceHub:
-    """Placeholder class to make tests pass."""
+    """Validation of device's connection settings."""
 
-    async def authenticate(self, hass: HomeAssistant, data: dict[str, Any]) -> None:
-        """Test if we can authenticate with the host."""
-        # If you cannot connect:
-        #   throw CannotConnect
-        # If the authentication is wrong:
-        #   throw InvalidAuth
-        newNMConnection(hass, data)
+    async def authenticate(
+        self, hass: HomeAssistant, data: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Read device's /info, returning it.
+
+        Raises CannotConnect if device does not answer and InvalidAuth
+        if it rejects the credentials. Probes are not retried, and at most
+        PROBE_CONCURRENCY devices are probed at once.
+        """
+        conn = newNMConnection(hass, data)
+        conn.max_attempts = 1
+        async with _probeSlots:
+            try:
+                return await read_device_info(conn)
+            finally:
+                await close_connection(conn)
+
+    async def probe(self, hass: HomeAssistant, data: dict[str, Any]) -> NMProbeResult:
+        """Time few /info and /data round-trips of the device."""
+        conn = newNMConnection(hass, data)
+        conn.max_attempts = 1
+        async with _probeSlots:
+            try:
+                return await probe_device(conn)
+            finally:
+                await close_connection(conn)
 
 
 async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str, Any]:
@@ -69,10 +240,12 @@ async def validate_input(hass: HomeAssistant, data: dict[str, Any]) -> dict[str,
     #     your_validate_func, data[CONF_USR], data[CONF_PWD]
     # )
 
-    await NodeMCUDeviceHub().authenticate(hass, data)
+    hub = NodeMCUDeviceHub()
+    info = await hub.authenticate(hass, data)
+    probe = await hub.probe(hass, data)
 
     # Return info that you want to store in the config entry.
-    return {"title": data[CONF_HOST]}
+    return {"title": data[CONF_HOST], "info": info, "probe": probe}
 
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
@@ -80,6 +253,20 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
 
     VERSION = 1
 
+    # connection settings of the device being added, prefilled from zeroconf
+    device: dict[str, Any]
+    # measured round-trips of the device, and options recommended from them
+    probe: NMProbeResult | None = None
+    tuned: dict[str, Any]
+
+    @staticmethod
+    @callback
+    def async_get_options_flow(
+        config_entry: config_entries.ConfigEntry,
+    ) -> config_entries.OptionsFlow:
+        """Create the options flow."""
+        return OptionsFlowHandler()
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> config_entries.ConfigFlowResult:
@@ -92,12 +279,226 @@ class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 errors["base"] = "cannot_connect"
             except InvalidAuth:
                 errors["base"] = "invalid_auth"
+            except NodeMCUDeviceException:
+                errors["base"] = "invalid_device"
             except Exception:  # pylint: disable=broad-except
                 _LOGGER.exception("Unexpected exception")
                 errors["base"] = "unknown"
             else:
-                return self.async_create_entry(title=info["title"], data=user_input)
+                self.device = user_input
+                self.probe = info["probe"]
+                return await self.async_step_tune()
 
         return self.async_show_form(
             step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
+
+    async def async_step_tune(
+        self, user_input: dict[str, Any] | None = None
+    ) -> config_entries.ConfigFlowResult:
+        """Confirm polling period and timeouts, recommended from measurements.
+
+        Period typed in the user step is kept, if it is not the default one.
+        """
+        if user_input is not None:
+            return self.async_create_entry(
+                title=self.device[CONF_HOST],
+                data={**self.device, CONF_PERIOD: user_input[CONF_PERIOD]},
+                options={
+                    k: user_input[k] for k in (CONF_TIMEOUT_CONNECT, CONF_TIMEOUT_READ)
+                },
+            )
+
+        assert self.probe is not None
+        suggested = recommend(self.probe)
+        if self.device.get(CONF_PERIOD, DEFAULT_PERIOD) != DEFAULT_PERIOD:
+            suggested[CONF_PERIOD] = self.device[CONF_PERIOD]
+        return self.async_show_form(
+            step_id="tune",
+            data_schema=self.add_suggested_values_to_schema(
+                STEP_TUNE_SCHEMA, suggested
+            ),
+            description_placeholders={"probe": describe(self.probe)},
+        )
+
+    async def _async_tune_discovered(self) -> None:
+        """Probe discovered device, recommending its period and timeouts.
+
+        Discovered devices are added without asking, hence failing probe
+        keeps the defaults.
+        """
+        try:
+            self.probe = await NodeMCUDeviceHub().probe(self.hass, self.device)
+        except (CannotConnect, InvalidAuth, NodeMCUDeviceException) as ex:
+            _LOGGER.debug("Probing %s failed: %s", self.device[CONF_HOST], ex)
+            return
+        self.tuned = recommend(self.probe)
+        self.device[CONF_PERIOD] = self.tuned.pop(CONF_PERIOD)
+
+    async def async_step_zeroconf(
+        self, discovery_info: ZeroconfServiceInfo
+    ) -> config_entries.ConfigFlowResult:
+        """Handle device advertised over mDNS, probing its /info."""
+        host = str(discovery_info.ip_address)
+        self.tuned = {}
+        self.device = {
+            CONF_HOST: host,
+            CONF_PORT: discovery_info.port or DEFAULT_PORT,
+            CONF_APIPATH: discovery_info.properties.get("path") or DEFAULT_APIPATH,
+            CONF_PROTOCOL: discovery_info.properties.get("protocol") or "http",
+            CONF_PERIOD: DEFAULT_PERIOD,
+        }
+        # mDNS host name stays with the device, its address may change (DHCP)
+        await self.async_set_unique_id(
+            f"{DOMAIN} {discovery_info.hostname.rstrip('.')}"
+        )
+        self._abort_if_unique_id_configured(updates={CONF_HOST: host})
+        # same device, set up by hand with its host name instead of the address
+        self._async_abort_entries_match({CONF_HOST: host})
+        self._async_abort_entries_match(
+            {CONF_HOST: discovery_info.hostname.rstrip(".")}
+        )
+
+        self.context["title_placeholders"] = {"name": host}
+        try:
+            info = await NodeMCUDeviceHub().authenticate(self.hass, self.device)
+        except InvalidAuth:
+            return await self.async_step_zeroconf_auth()
+        except CannotConnect:
+            return self.async_abort(reason="cannot_connect")
+        except NodeMCUDeviceException:
+            # advertises the service, but does not answer as NodeMCU device
+            return self.async_abort(reason="invalid_device")
+        self.context["title_placeholders"] = {"name": info.get("name") or host}
+        await self._async_tune_discovered()
+        return await self.async_step_zeroconf_confirm()
+
+    async def async_step_zeroconf_auth(
+        self, user_input: dict[str, Any] | None = None
+    ) -> config_entries.ConfigFlowResult:
+        """Ask for credentials of discovered device rejecting anonymous access."""
+        errors: dict[str, str] = {}
+        if user_input is not None:
+            data = {**self.device, **user_input}
+            try:
+                await NodeMCUDeviceHub().authenticate(self.hass, data)
+            except CannotConnect:
+                errors["base"] = "cannot_connect"
+            except InvalidAuth:
+                errors["base"] = "invalid_auth"
+            except NodeMCUDeviceException:
+                return self.async_abort(reason="invalid_device")
+            else:
+                self.device = data
+                await self._async_tune_discovered()
+                return await self.async_step_zeroconf_confirm()
+
+        return self.async_show_form(
+            step_id="zeroconf_auth",
+            data_schema=STEP_ZEROCONF_AUTH_SCHEMA,
+            errors=errors,
+            description_placeholders=self.context["title_placeholders"],
+        )
+
+    async def async_step_zeroconf_confirm(
+        self, user_input: dict[str, Any] | None = None
+    ) -> config_entries.ConfigFlowResult:
+        """Confirm adding discovered device, optionally all others discovered too."""
+        if user_input is not None:
+            if user_input.get(CONF_CONFIRM_ALL):
+                await self._async_confirm_all_discovered()
+            return self.async_create_entry(
+                title=self.device[CONF_HOST], data=self.device, options=self.tuned
+            )
+
+        return self.async_show_form(
+            step_id="zeroconf_confirm",
+            data_schema=STEP_ZEROCONF_CONFIRM_SCHEMA,
+            description_placeholders={
+                **self.context["title_placeholders"],
+                "host": self.device[CONF_HOST],
+            },
+        )
+
+    async def _async_confirm_all_discovered(self) -> None:
+        """Confirm all other discovered devices waiting in zeroconf_confirm step.
+
+        Devices which could not be added are logged, with the reason.
+        """
+        flows = [
+            f["flow_id"]
+            for f in self.hass.config_entries.flow.async_progress_by_handler(DOMAIN)
+            if f["flow_id"] != self.flow_id
+            and f.get("step_id") == "zeroconf_confirm"
+        ]
+        _LOGGER.info("Adding %d discovered NodeMCU devices", len(flows))
+        results = await asyncio.gather(
+            *(
+                self.hass.config_entries.flow.async_configure(
+                    flowId, {CONF_CONFIRM_ALL: False}
+                )
+                for flowId in flows
+            ),
+            return_exceptions=True,
+        )
+        added = 0
+        for flowId, result in zip(flows, results, strict=True):
+            if isinstance(result, Exception):
+                _LOGGER.warning(
+                    "Failed adding discovered device %s: %s", flowId, result
+                )
+            elif result["type"] != FlowResultType.CREATE_ENTRY:
+                _LOGGER.warning(
+                    "Discovered device %s was not added: %s",
+                    flowId,
+                    result.get("reason") or result.get("errors"),
+                )
+            else:
+                added += 1
+        _LOGGER.info("Added %d of %d discovered NodeMCU devices", added, len(flows))
+
+
+class OptionsFlowHandler(config_entries.OptionsFlow):
+    """Handle tuning options of a set up device."""
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> config_entries.ConfigFlowResult:
+        """Manage the options.
+
+        With probe ticked, device's round-trips are measured and the form
+        is shown again with recommended period and timeouts.
+        Adaptive period bounds are rejected if period_min exceeds period_max.
+        """
+        errors: dict[str, str] = {}
+        current = {**self.config_entry.data, **self.config_entry.options}
+        probed = "-"
+        if user_input is not None:
+            probing = user_input.pop(CONF_PROBE, False)
+            current = {**current, **user_input}
+            if user_input[CONF_PERIOD_MIN] > user_input[CONF_PERIOD_MAX]:
+                errors[CONF_PERIOD_MIN] = "period_bounds"
+            elif not probing:
+                return self.async_create_entry(data=user_input)
+            else:
+                try:
+                    probe = await NodeMCUDeviceHub().probe(self.hass, current)
+                except CannotConnect:
+                    errors["base"] = "cannot_connect"
+                except InvalidAuth:
+                    errors["base"] = "invalid_auth"
+                except NodeMCUDeviceException as ex:
+                    _LOGGER.warning("Probing %s failed: %s", current[CONF_HOST], ex)
+                    errors["base"] = "unknown"
+                else:
+                    current.update(recommend(probe))
+                    probed = describe(probe)
+
+        return self.async_show_form(
+            step_id="init",
+            data_schema=self.add_suggested_values_to_schema(
+                OPTIONS_PROBE_SCHEMA, current
+            ),
+            errors=errors,
+            description_placeholders={"probe": probed},
+        )
@@ -12,6 +12,95 @@ CONF_PROTOCOL: Final = "protocol"
 CONF_PERIOD: Final = "period"
 CONF_USR: Final = "username"
 CONF_PWD: Final = "password"
+# zeroconf confirm step, confirming all other discovered devices as well
+CONF_CONFIRM_ALL: Final = "confirm_all"
+# options form, measuring device's round-trips to recommend period and timeouts
+CONF_PROBE: Final = "probe"
+
+DEFAULT_PORT: Final = 80
+DEFAULT_APIPATH: Final = "/api/ha"
+DEFAULT_PERIOD: Final = 300
+
+# options, tunable after device is set up
+CONF_WRITE_WINDOW: Final = "write_window"
+CONF_OPTIMISTIC: Final = "optimistic"
+CONF_TRANSPORT: Final = "transport"
+CONF_LONGPOLL_WAIT: Final = "longpoll_wait"
+CONF_ADAPTIVE: Final = "adaptive"
+CONF_PERIOD_MIN: Final = "period_min"
+CONF_PERIOD_MAX: Final = "period_max"
+CONF_PERIOD_FAST: Final = "period_fast"
+CONF_PERIOD_SLOW: Final = "period_slow"
+CONF_TIMEOUT_CONNECT: Final = "timeout_connect"
+CONF_TIMEOUT_READ: Final = "timeout_read"
+CONF_RETRIES: Final = "retries"
+
+# how data changes reach the integration
+TRANSPORT_POLL: Final = "poll"
+TRANSPORT_WEBSOCKET: Final = "websocket"
+TRANSPORT_LONGPOLL: Final = "longpoll"
+TRANSPORTS: Final = [TRANSPORT_POLL, TRANSPORT_WEBSOCKET, TRANSPORT_LONGPOLL]
+
+# seconds to wait for the device to accept connection, and for each read of its answer
+DEFAULT_TIMEOUT_CONNECT: Final = 5
+DEFAULT_TIMEOUT_READ: Final = 10
+# retries of failed request, subject to retry budget
+DEFAULT_RETRIES: Final = 3
+
+# seconds to collect concurrent entity writes into single POST
+DEFAULT_WRITE_WINDOW: Final = 0.05
+
+# seconds between websocket (or long-poll) reconnect attempts, doubling up to the max
+WS_RECONNECT_MIN: Final = 5
+WS_RECONNECT_MAX: Final = 300
+
+# seconds the device may hold long-poll GET /data before answering 304
+DEFAULT_LONGPOLL_WAIT: Final = 60
+
+# bounds in seconds of the adaptive polling period
+DEFAULT_PERIOD_MIN: Final = 10
+DEFAULT_PERIOD_MAX: Final = 900
+# adaptive period multipliers when data changes, stays same or polling fails
+ADAPTIVE_ON_CHANGE: Final = 0.5
+ADAPTIVE_ON_STABLE: Final = 1.25
+ADAPTIVE_ON_FAILURE: Final = 2
+
+# platforms which can apply written values locally instead of refreshing
+OPTIMISTIC_PLATFORMS: Final = ["climate", "humidifier", "light", "switch"]
+
+# polling periods in seconds of "fast" and "slow" poll groups,
+# "normal" group is polled with the device's period
+DEFAULT_PERIOD_FAST: Final = 30
+DEFAULT_PERIOD_SLOW: Final = 1800
+
+# poll groups, entities can be assigned to in DeviceSpec
+POLL_GROUP_FAST: Final = "fast"
+POLL_GROUP_NORMAL: Final = "normal"
+POLL_GROUP_SLOW: Final = "slow"
+
+# DeviceSpec entry properties used by the integration itself,
+# these are not passed to EntityDescription
+SPEC_OPTIMISTIC: Final = "optimistic"
+SPEC_POLL_GROUP: Final = "poll_group"
+# sensor's native_value change to ignore, absolute number or "<number>%"
+SPEC_DEADBAND: Final = "deadband"
+# seconds between sensor's state writes, more frequent changes are deferred
+SPEC_MIN_INTERVAL: Final = "min_interval"
+# child device of a hub, the entity belongs to. Set by the integration itself.
+SPEC_DEVICE: Final = "device"
+SPEC_OPTIONS: Final = (
+    SPEC_OPTIMISTIC,
+    SPEC_POLL_GROUP,
+    SPEC_DEADBAND,
+    SPEC_MIN_INTERVAL,
+    SPEC_DEVICE,
+)
+
+# profile service, profiling next refreshes of one or all devices
+SERVICE_PROFILE: Final = "profile"
+ATTR_ENTRY_ID: Final = "entry_id"
+ATTR_COUNT: Final = "count"
+ATTR_TIMEOUT: Final = "timeout"
 
 
 class CannotConnect(HomeAssistantError):
@@ -1,26 +1,68 @@
 """HASS object to coordinate update of multiple sensors (NMEntity) together via single request."""
 
-from datetime import timedelta
+import asyncio
+from contextlib import nullcontext
+from datetime import datetime, timedelta
 from logging import Logger
-from typing import Any
+import time
+from typing import Any, Final
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import CALLBACK_TYPE, HomeAssistant, callback
 from homeassistant.exceptions import IntegrationError
 from homeassistant.helpers.debounce import Debouncer
 from homeassistant.helpers.device_registry import DeviceEntry, DeviceInfo
+from homeassistant.helpers.event import async_track_time_interval
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
 
-from .const import CONF_HOST, CONF_PERIOD
+from .const import (
+    ADAPTIVE_ON_CHANGE,
+    ADAPTIVE_ON_FAILURE,
+    ADAPTIVE_ON_STABLE,
+    CONF_ADAPTIVE,
+    CONF_HOST,
+    CONF_OPTIMISTIC,
+    CONF_PERIOD,
+    CONF_PERIOD_FAST,
+    CONF_PERIOD_MAX,
+    CONF_PERIOD_MIN,
+    CONF_PERIOD_SLOW,
+    CONF_WRITE_WINDOW,
+    DEFAULT_PERIOD,
+    DEFAULT_PERIOD_FAST,
+    DEFAULT_PERIOD_MAX,
+    DEFAULT_PERIOD_MIN,
+    DEFAULT_PERIOD_SLOW,
+    DEFAULT_WRITE_WINDOW,
+    POLL_GROUP_FAST,
+    POLL_GROUP_NORMAL,
+    POLL_GROUP_SLOW,
+    SPEC_OPTIONS,
+    SPEC_POLL_GROUP,
+    WS_RECONNECT_MAX,
+    WS_RECONNECT_MIN,
+    CannotConnect,
+    InvalidAuth,
+)
 from .mediation import (
     NMConnection,
     NMDeviceData,
     NodeMCUDeviceException,
+    close_connection,
     newNMConnection,
     read_device_data,
-    read_device_info,
-    read_device_spec,
+    read_device_data_keys,
+    read_device_info_and_spec,
+    run_device_websocket,
+    stubHost,
 )
+from .profiler import NMProfileSession
+from .spec_cache import async_load_cached, async_save_cached
+from .utils import KeyPath, deep_merged
+from .writer import NMWriteBatcher
+
+# marks key missing in partial read answer
+_MISSING: Final = object()
 
 
 class NMDeviceCoordinator(DataUpdateCoordinator[NMDeviceData]):
@@ -36,11 +78,241 @@ class NMDeviceCoordinator(DataUpdateCoordinator[NMDeviceData]):
     conf_entry: ConfigEntry
     device_entry: DeviceEntry
     device_info: DeviceInfo
+    # DeviceInfo of hub's child devices, per child id; empty if not a hub
+    child_device_infos: dict[str, DeviceInfo]
 
     # "device info" object as dict_to_obj result of upload of "/info" endpoint
     read_device_info: dict[str, str]
-    # "device specification" as json result of upload of "/spec" endpoint
+    # "device specification" as json result of upload of "/spec" endpoint,
+    # entries without the integration's own properties (see split_spec)
     read_device_spec: dict[str, Any]
+    # integration's own properties of spec entries, per entity key
+    spec_options: dict[str, dict[str, Any]]
+    # "/spec" as read from the device, before split_spec
+    raw_device_spec: dict[str, Any]
+    # if info and spec were loaded from the persistent cache
+    spec_from_cache: bool
+
+    # coalesces entity writes into single POST /data
+    writer: NMWriteBatcher
+    # platforms applying written values locally, instead of refreshing the data
+    optimistic_platforms: list[str]
+
+    # keys of entities per poll group ("fast", "normal", "slow"),
+    # empty if all entities are polled together with single full read
+    poll_groups: dict[str, list[KeyPath]]
+
+    # (min, max) seconds of adaptive polling period, None if the period is fixed
+    period_bounds: tuple[float, float] | None = None
+    # number of consecutive failed polls
+    failure_streak: int = 0
+    # if the running refresh is the scheduled poll, only these adapt the period
+    _scheduled_refresh: bool = False
+    # profile session of nodemcu.profile service, while it runs
+    profiler: NMProfileSession | None = None
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        """Initialize the coordinator with DataUpdateCoordinator's arguments."""
+        super().__init__(*args, **kwargs)
+        self._diagnostic_listeners = []
+
+    @property
+    def breaker_state(self) -> str:
+        """State of device's circuit breaker: "closed", "open" or "half_open"."""
+        return self.conn.breaker.state
+
+    # data and status entities were last notified with, used to detect changed keys
+    _dispatched_data: NMDeviceData | None = None
+    _dispatched_success: bool = False
+    # callbacks of diagnostic entities, notified after every refresh
+    _diagnostic_listeners: list[CALLBACK_TYPE]
+    # if diagnostic entities were notified during the running refresh
+    _diagnostics_dispatched: bool = False
+
+    async def _async_update_data(self) -> NMDeviceData:
+        """Poll the device, adapting polling period if adaptive polling is on.
+
+        Period shortens while data keeps changing, lengthens while it is stable
+        and backs off exponentially while polling fails. Only scheduled polls
+        adapt it, refreshes requested after writes or by push transports and
+        polls skipped while websocket is connected do not tell the change rate.
+        """
+        adapt = self._scheduled_refresh and self.conn.ws is None
+        profiler = self.profiler
+        with profiler.span("refresh", self.name) if profiler else nullcontext():
+            try:
+                data = await super()._async_update_data()
+            except UpdateFailed:
+                self.failure_streak += 1
+                if adapt:
+                    self._adapt_period(ADAPTIVE_ON_FAILURE)
+                raise
+            finally:
+                if profiler:
+                    profiler.async_refresh_done(self.conf_entry.entry_id)
+        self.failure_streak = 0
+        if adapt:
+            changed = data is not self.data and data != self.data
+            self._adapt_period(ADAPTIVE_ON_CHANGE if changed else ADAPTIVE_ON_STABLE)
+        return data
+
+    async def _handle_refresh_interval(self, _now: datetime | None = None) -> None:
+        """Run scheduled poll, marked as such for period adaptation."""
+        self._scheduled_refresh = True
+        try:
+            await super()._handle_refresh_interval(_now)
+        finally:
+            self._scheduled_refresh = False
+
+    async def _async_refresh(self, *args: Any, **kwargs: Any) -> None:
+        """Refresh the data, notifying diagnostic entities also if it is unchanged.
+
+        With always_update=False the listeners are not notified if the data
+        has not changed, while telemetry has.
+        """
+        self._diagnostics_dispatched = False
+        await super()._async_refresh(*args, **kwargs)
+        if not self._diagnostics_dispatched:
+            self._async_update_diagnostics()
+
+    @callback
+    def async_add_diagnostic_listener(
+        self, update_callback: CALLBACK_TYPE
+    ) -> CALLBACK_TYPE:
+        """Listen for telemetry updates, return function removing the listener."""
+        self._diagnostic_listeners.append(update_callback)
+
+        @callback
+        def _remove() -> None:
+            self._diagnostic_listeners.remove(update_callback)
+
+        return _remove
+
+    @callback
+    def _async_update_diagnostics(self) -> None:
+        self._diagnostics_dispatched = True
+        for update_callback in list(self._diagnostic_listeners):
+            update_callback()
+
+    def _adapt_period(self, factor: float) -> None:
+        """Multiply polling period by factor, within period bounds."""
+        if self.period_bounds is None or self.update_interval is None:
+            return
+        periodMin, periodMax = self.period_bounds
+        period = self.update_interval.total_seconds() * factor
+        period = min(max(period, periodMin), periodMax)
+        self.update_interval = timedelta(seconds=period)
+
+    @callback
+    def async_update_listeners(self) -> None:
+        """Notify only listeners whose data key has changed since last notification.
+
+        Entities register with their spec KeyPath as listener context.
+        Listeners without such context and availability changes are always notified.
+        Diagnostic entities are notified last, with the fanout recorded.
+        """
+        previous = self._dispatched_data
+        notifyAll = (
+            previous is None
+            or not self.last_update_success
+            or self._dispatched_success != self.last_update_success
+        )
+        self._dispatched_data = self.data
+        self._dispatched_success = self.last_update_success
+
+        profiler = self.profiler
+        start = time.perf_counter()
+        with profiler.span("fanout", self.name) if profiler else nullcontext():
+            for update_callback, context in list(self._listeners.values()):
+                if (
+                    notifyAll
+                    or not isinstance(context, KeyPath)
+                    or context.get(previous) != context.get(self.data)
+                ):
+                    update_callback()
+        self.conn.telemetry.record_fanout(time.perf_counter() - start)
+        self._async_update_diagnostics()
+
+    async def async_read_group(self, keys: list[KeyPath]) -> NMDeviceData:
+        """Read the keys from the device and return current data updated with them.
+
+        Falls back to full read if the device does not support partial reads.
+        """
+        if self.conn.partial_reads is False or self.data is None:
+            return await read_device_data(self.conn)
+        partial = await read_device_data_keys(self.conn, [k.key for k in keys])
+        if self.conn.partial_reads is None:
+            requested = {str(k.segments[0]) for k in keys}
+            self.conn.partial_reads = set(partial).issubset(requested)
+            if not self.conn.partial_reads:
+                self.logger.info(
+                    "Device %s does not support partial reads", self.conn.hostname
+                )
+                return partial
+        data = self.data
+        for k in keys:
+            # keys the device has not answered keep their previous value
+            if (value := k.get(partial, _MISSING)) is not _MISSING:
+                data = k.replaced(data, value)
+        return data
+
+    @callback
+    def async_apply_written(self, key: KeyPath, payload: dict[str, Any]) -> None:
+        """Merge written payload into current data and notify affected entities.
+
+        Polling schedule is not touched, next poll reconciles with the device.
+        """
+        if self.data is None:
+            return
+        self.async_apply_data(key.merged(self.data, payload))
+
+    @callback
+    def async_apply_data(self, data: NMDeviceData) -> None:
+        """Replace current data and notify affected entities, keep polling schedule."""
+        self.data = data
+        self.async_update_listeners()
+
+
+def _pollGroups(
+    spec_options: dict[str, dict[str, Any]], spec: dict[str, Any]
+) -> dict[str, list[KeyPath]]:
+    """Group entity keys by their poll group, empty if all are in "normal" group."""
+    groups: dict[str, list[KeyPath]] = {}
+    for entries in spec.values():
+        for entry in entries:
+            group = spec_options.get(entry["key"], {}).get(
+                SPEC_POLL_GROUP, POLL_GROUP_NORMAL
+            )
+            groups.setdefault(group, []).append(KeyPath(entry["key"]))
+    if set(groups) == {POLL_GROUP_NORMAL}:
+        return {}
+    return groups
+
+
+def split_spec(
+    spec: dict[str, Any],
+) -> tuple[dict[str, Any], dict[str, dict[str, Any]]]:
+    """Separate integration's own properties from DeviceSpec entries.
+
+    Returns spec usable for EntityDescription and the properties per entity key.
+    """
+    cleanSpec: dict[str, Any] = {}
+    options: dict[str, dict[str, Any]] = {}
+    for platform, entries in spec.items():
+        cleanEntries = []
+        for entry in entries:
+            opts = {k: entry[k] for k in SPEC_OPTIONS if k in entry}
+            if opts:
+                options[entry["key"]] = opts
+                entry = {k: v for k, v in entry.items() if k not in opts}
+            cleanEntries.append(entry)
+        cleanSpec[platform] = cleanEntries
+    return cleanSpec, options
+
+
+def entry_conf(entry: ConfigEntry, key: str, default: Any) -> Any:
+    """Get config value, options take precedence over initial setup data."""
+    return entry.options.get(key, entry.data.get(key, default))
 
 
 async def newCoordinator(
@@ -55,20 +327,32 @@ async def newCoordinator(
     It creates connection object (NMConnection) and reads device's info and spec.
     """
 
-    conn = newNMConnection(hass, entry.data)
+    conn = newNMConnection(hass, {**entry.data, **entry.options})
 
-    try:
-        device_info = await read_device_info(conn)
-        spec = await read_device_spec(conn)
-    except NodeMCUDeviceException as ex:
-        raise IntegrationError(ex) from ex
+    # use last good info and spec if cached, these are revalidated once entry is set up
+    cached = await async_load_cached(hass, entry, conn)
+    if cached is not None:
+        device_info, spec = cached
+        conn.hub = bool(device_info.get("hub"))
+    else:
+        try:
+            device_info, spec = await read_device_info_and_spec(conn)
+        except NodeMCUDeviceException as ex:
+            await close_connection(conn)
+            raise IntegrationError(ex) from ex
+        await async_save_cached(hass, entry, conn, device_info, spec)
 
     async def _updateFnc() -> NMDeviceData:
         # actual update logic, pulling data from the device
         # inline function having "conn" upvalue
+        if conn.ws is not None and c.data is not None:
+            # device pushes its changes over websocket, nothing to poll
+            return c.data
         try:
+            if normalKeys := c.poll_groups.get(POLL_GROUP_NORMAL):
+                return await c.async_read_group(normalKeys)
             return await read_device_data(conn)
-        except NodeMCUDeviceException as ex:
+        except (CannotConnect, NodeMCUDeviceException) as ex:
             raise UpdateFailed(ex) from ex
 
     # constructor args for base class
@@ -77,8 +361,12 @@ async def newCoordinator(
         logger=logger,
         name=entry.data[CONF_HOST],
         # update data every 10sec
-        update_interval=timedelta(seconds=entry.data[CONF_PERIOD]),
+        update_interval=timedelta(
+            seconds=entry_conf(entry, CONF_PERIOD, DEFAULT_PERIOD)
+        ),
         update_method=_updateFnc,
+        # notify entities only if data has changed (i.e. not on 304 Not Modified)
+        always_update=False,
         # delay 500ms before reading the state after update
         request_refresh_debouncer=Debouncer(
             hass, logger, cooldown=0.5, immediate=False
@@ -87,10 +375,140 @@ async def newCoordinator(
     # own class arguments
     c.conn = conn
     c.conf_entry = entry
+    c.child_device_infos = {}
     c.read_device_info = device_info
-    c.read_device_spec = spec
+    c.spec_from_cache = cached is not None
+    c.raw_device_spec = spec
+    c.read_device_spec, c.spec_options = split_spec(spec)
+    c.poll_groups = _pollGroups(c.spec_options, c.read_device_spec)
+    c.writer = NMWriteBatcher(
+        hass,
+        conn,
+        entry_conf(entry, CONF_WRITE_WINDOW, DEFAULT_WRITE_WINDOW),
+        c.async_request_refresh,
+    )
+    c.optimistic_platforms = entry_conf(entry, CONF_OPTIMISTIC, [])
+    if entry_conf(entry, CONF_ADAPTIVE, False):
+        c.period_bounds = (
+            entry_conf(entry, CONF_PERIOD_MIN, DEFAULT_PERIOD_MIN),
+            entry_conf(entry, CONF_PERIOD_MAX, DEFAULT_PERIOD_MAX),
+        )
 
     # c.deviceInfo is set by async_setup_entry
     # c.deviceEntry is set by async_setup_entry
 
     return c
+
+
+async def async_run_websocket(c: NMDeviceCoordinator) -> None:
+    """Keep websocket to the device open, applying data pushed by the device.
+
+    While the socket is down, the coordinator polls as usual.
+    Meant to run as entry's background task.
+    """
+
+    pushed = False
+
+    @callback
+    def _onData(data: NMDeviceData, full: bool) -> None:
+        nonlocal pushed
+        pushed = True
+        if not full and c.data is not None:
+            data = deep_merged(c.data, data)
+        c.async_set_updated_data(data)
+
+    delay = WS_RECONNECT_MIN
+    while True:
+        pushed = False
+        try:
+            await run_device_websocket(c.conn, _onData)
+            c.logger.info("Websocket to %s closed, polling", c.conn.hostname)
+        except (CannotConnect, InvalidAuth, NodeMCUDeviceException) as ex:
+            c.logger.debug("Websocket to %s failed: %s", c.conn.hostname, ex)
+        except Exception:  # pylint: disable=broad-except
+            # e.g. failing entity listener, keep the socket reconnecting
+            c.logger.exception("Websocket to %s failed unexpectedly", c.conn.hostname)
+        # socket was working, reconnect quickly
+        delay = WS_RECONNECT_MIN if pushed else min(delay * 2, WS_RECONNECT_MAX)
+        # catch up with changes missed while the socket was down
+        await c.async_request_refresh()
+        await asyncio.sleep(delay)
+
+
+async def async_run_longpoll(c: NMDeviceCoordinator, wait: int) -> None:
+    """Loop on long-poll GET /data, applying data as soon as the device answers.
+
+    Each answer postpones the scheduled poll, which runs only if long-poll fails.
+    Stops if the device does not support long-poll (answers without X-Seq header).
+    Answers without change arriving before wait expires are backed off like
+    failures, so a device answering right away cannot spin the loop.
+    Meant to run as entry's background task.
+    """
+    delay = WS_RECONNECT_MIN
+    while True:
+        previous = c.conn.data_cache
+        start = time.monotonic()
+        try:
+            data = await read_device_data(c.conn, wait)
+        except (CannotConnect, InvalidAuth, NodeMCUDeviceException) as ex:
+            c.logger.debug("Long-poll of %s failed: %s", c.conn.hostname, ex)
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX)
+            continue
+        if data is previous and time.monotonic() - start < wait:
+            c.logger.debug(
+                "Long-poll of %s answered early without change", c.conn.hostname
+            )
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WS_RECONNECT_MAX)
+        else:
+            delay = WS_RECONNECT_MIN
+        c.async_set_updated_data(data)
+        if c.conn.data_seq is None and c.conn.hostname != stubHost:
+            c.logger.warning(
+                "Device %s does not support long-poll, polling", c.conn.hostname
+            )
+            return
+
+
+def async_track_poll_groups(c: NMDeviceCoordinator) -> list[CALLBACK_TYPE]:
+    """Poll "fast" and "slow" groups of entities with their own periods.
+
+    "normal" group is polled by the coordinator itself.
+    Returns the callbacks to stop the polling.
+    """
+    entry = c.conf_entry
+    periods = {
+        POLL_GROUP_FAST: entry_conf(entry, CONF_PERIOD_FAST, DEFAULT_PERIOD_FAST),
+        POLL_GROUP_SLOW: entry_conf(entry, CONF_PERIOD_SLOW, DEFAULT_PERIOD_SLOW),
+    }
+    running: set[str] = set()
+
+    def _newPoll(group: str, keys: list[KeyPath]):
+        async def _poll(_: Any) -> None:
+            if group in running or c.data is None:
+                return
+            if c.conn.partial_reads is False and group == POLL_GROUP_SLOW:
+                # full reads of "normal" group cover this group too
+                return
+            running.add(group)
+            try:
+                data = await c.async_read_group(keys)
+            except (CannotConnect, NodeMCUDeviceException) as ex:
+                c.logger.debug(
+                    "Polling %s group of %s failed: %s", group, c.conn.hostname, ex
+                )
+                return
+            finally:
+                running.discard(group)
+            c.async_apply_data(data)
+
+        return _poll
+
+    return [
+        async_track_time_interval(
+            c.hass, _newPoll(group, keys), timedelta(seconds=periods[group])
+        )
+        for group, keys in c.poll_groups.items()
+        if group in periods
+    ]
@@ -0,0 +1,57 @@
+"""Diagnostics support for NodeMCU."""
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import CONF_PWD, CONF_USR, DOMAIN
+from .coordinator import NMDeviceCoordinator
+
+TO_REDACT = {CONF_PWD, CONF_USR}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics of the device, with rolling performance summary."""
+    coordinator: NMDeviceCoordinator = hass.data[DOMAIN][entry.entry_id]
+    conn = coordinator.conn
+    return {
+        "entry": {
+            "data": async_redact_data(entry.data, TO_REDACT),
+            "options": dict(entry.options),
+        },
+        "device_info": coordinator.read_device_info,
+        "spec_from_cache": coordinator.spec_from_cache,
+        "connection": {
+            "hub": conn.hub,
+            "websocket": conn.ws is not None,
+            "content_type": conn.data_content_type,
+            "partial_reads": conn.partial_reads,
+            "breaker": coordinator.breaker_state,
+            "retry_budget": round(conn.retry_budget.tokens, 2),
+        },
+        "polling": {
+            "update_interval": (
+                coordinator.update_interval.total_seconds()
+                if coordinator.update_interval
+                else None
+            ),
+            "last_update_success": coordinator.last_update_success,
+            "failure_streak": coordinator.failure_streak,
+        },
+        "telemetry": conn.telemetry.summary(),
+        "transfer": {
+            endpoint: {
+                "requests": s.requests,
+                "wire_bytes": s.wire_bytes,
+                "body_bytes": s.body_bytes,
+                "compression_ratio": round(s.ratio, 2),
+                "avg_ms": round(s.seconds / s.requests * 1000, 2),
+                "last_ms": round(s.last_seconds * 1000, 2),
+            }
+            for endpoint, s in conn.transfer_stats.items()
+        },
+    }
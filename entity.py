@@ -1,14 +1,28 @@
 """The module contains the NMBaseEntity class and related functions for NodeMCU sensors."""
 
-from typing import Any, cast
+from contextlib import nullcontext
+from datetime import datetime
+from enum import IntFlag
+import logging
+import time
+from typing import Any, ClassVar, cast
 
+from homeassistant.core import CALLBACK_TYPE, callback
 from homeassistant.helpers.entity import Entity, EntityDescription
+from homeassistant.helpers.event import async_call_later
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import DOMAIN
+from .const import (
+    DOMAIN,
+    SPEC_DEADBAND,
+    SPEC_DEVICE,
+    SPEC_MIN_INTERVAL,
+    SPEC_OPTIMISTIC,
+)
 from .coordinator import NMDeviceCoordinator
-from .mediation import update_device_data
-from .utils import deep_get, deepdict, dict_to_attr
+from .utils import KeyPath, dict_to_attr
+
+_LOGGER = logging.getLogger(__name__)
 
 
 class NMBaseEntity(CoordinatorEntity[NMDeviceCoordinator], Entity):
@@ -18,21 +32,53 @@ class NMBaseEntity(CoordinatorEntity[NMDeviceCoordinator], Entity):
     are updated together, with single request to the device.
     """
 
+    # data attributes converted from int to IntFlag, like "supported_features"
+    enum_attrs: ClassVar[dict[str, type[IntFlag]]] = {}
+
+    # fingerprint of the last written state, see _fingerprint()
+    _written_fingerprint: tuple[bool, Any] | None = None
+    # (deadband, True if it is percent of the last written value) from spec entry
+    _deadband: tuple[float, bool] | None = None
+    # seconds between state writes from spec entry, 0 if not limited
+    _min_interval: float = 0
+    # monotonic time of the last state write
+    _written_at: float = 0
+    # cancels write deferred because of min_interval
+    _deferred: CALLBACK_TYPE | None = None
+
     def __init__(
         self,
         coordinator: NMDeviceCoordinator,
         description: EntityDescription,
     ) -> None:
         """Initialize a NodeMCU sensor."""
-        super().__init__(coordinator)
+        # compiled once, used for reading entity data and building write deltas
+        self.key_path = KeyPath(description.key)
+        # key as context, coordinator notifies the entity only if its data has changed
+        super().__init__(coordinator, context=self.key_path)
         self.entity_description = description
+        # integration's own properties from entity's DeviceSpec entry
+        self.spec_options = coordinator.spec_options.get(description.key, {})
+        self._deadband = _parseDeadband(
+            description.key, self.spec_options.get(SPEC_DEADBAND)
+        )
+        self._min_interval = _parseMinInterval(
+            description.key, self.spec_options.get(SPEC_MIN_INTERVAL)
+        )
 
+        uniquePrefix = str(coordinator.conf_entry.unique_id)
+        deviceInfo = coordinator.device_info
         deviceName = (
-            f"{coordinator.conn.hostname} {coordinator.read_device_info["name"]}"
+            f"{coordinator.conn.hostname} {coordinator.read_device_info['name']}"
         )
+        if (child := self.spec_options.get(SPEC_DEVICE)) is not None:
+            # entity of hub's child device
+            uniquePrefix = f"{uniquePrefix} {child}"
+            deviceInfo = coordinator.child_device_infos.get(child, deviceInfo)
+            deviceName = deviceInfo.get("name", child)
         self.entity_id = f"{DOMAIN}.{coordinator.conn.hostname}"
         self._attr_name = f"{deviceName} {description.name}"
-        self._attr_unique_id = f"{coordinator.conf_entry.unique_id} {description.name}"
+        self._attr_unique_id = f"{uniquePrefix} {description.name}"
         # self._attr_device_info = {
         #     "name": f"{deviceName} {description.name}",
         #     "via_device": (DOMAIN, coordinator.confEntry.entry_id),
@@ -40,7 +86,19 @@ class NMBaseEntity(CoordinatorEntity[NMDeviceCoordinator], Entity):
         #     "identifiers": coordinator.deviceEntry.identifiers,
         # }
         self._attr_extra_state_attributes = {"hostname": coordinator.conn.hostname}
-        self._attr_device_info = coordinator.device_info
+        self._attr_device_info = deviceInfo
+
+    @property
+    def optimistic(self) -> bool:
+        """Apply written values locally, instead of refreshing device data.
+
+        Spec entry "optimistic" property takes precedence over device options.
+        """
+        return self.spec_options.get(
+            SPEC_OPTIMISTIC,
+            self.platform is not None
+            and self.platform.domain in self.coordinator.optimistic_platforms,
+        )
 
     def update_entity(self) -> None:
         """Update an entity after a device async_update()."""
@@ -49,27 +107,163 @@ class NMBaseEntity(CoordinatorEntity[NMDeviceCoordinator], Entity):
 
         # Note: it expects the table keys are named after Entity attributes
         # in the form of "_attr_<key>"
-        tbl = deep_get(self.coordinator.data, self.entity_description.key, {})
+        tbl = self.key_path.get(self.coordinator.data, {})
         tbl = self.on_update(tbl)
-        dict_to_attr(self, cast(dict[str, Any], tbl))
+        dict_to_attr(self, cast(dict[str, Any], tbl), self.enum_attrs)
 
     def on_update(self, tbl: dict[str, Any]) -> dict[str, Any]:
         """Subclass to do something to data before setting attributes to self."""
         return tbl
 
+    def _fingerprint(self) -> tuple[bool, Any]:
+        """Return what entity's state is derived from: availability and its data.
+
+        Data of unchanged keys is the same object between polls, so comparing
+        fingerprints is mostly an identity check.
+        """
+        return self.available, self.key_path.get(self.coordinator.data, {})
+
+    def mark_written(self) -> None:
+        """Take entity's current data as written, coordinator updates skip it."""
+        self._written_fingerprint = self._fingerprint()
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Update attributes and write hass state, single update path of the entity.
+
+        The write is skipped if neither entity's data nor availability has changed,
+        e.g. while polls of unreachable device keep failing. Changes within spec's
+        deadband are skipped too and writes more frequent than spec's min_interval
+        are deferred. Availability transitions always write right away.
+        """
+        fingerprint = self._fingerprint()
+        written = self._written_fingerprint
+        if fingerprint == written:
+            return
+        if written is not None and fingerprint[0] == written[0]:
+            if self._within_deadband(fingerprint[1], written[1]):
+                return
+            wait = self._written_at + self._min_interval - time.monotonic()
+            if wait > 0:
+                if self._deferred is None:
+                    self._deferred = async_call_later(
+                        self.hass, wait, self._async_deferred_write
+                    )
+                return
+        self._write_state(fingerprint)
+
+    @callback
+    def _async_deferred_write(self, _: datetime) -> None:
+        """Write the latest state, once min_interval since the last write passed."""
+        self._deferred = None
+        fingerprint = self._fingerprint()
+        written = self._written_fingerprint
+        if fingerprint != written and (
+            written is None
+            or fingerprint[0] != written[0]
+            or not self._within_deadband(fingerprint[1], written[1])
+        ):
+            self._write_state(fingerprint)
+
+    def _within_deadband(self, data: Any, written: Any) -> bool:
+        """Check if only native_value has changed and less than the deadband."""
+        if self._deadband is None:
+            return False
+        if not isinstance(data, dict) or not isinstance(written, dict):
+            return False
+        new, old = data.get("native_value"), written.get("native_value")
+        if not _isNumber(new) or not _isNumber(old):
+            return False
+        band, percent = self._deadband
+        if percent:
+            band = abs(old) * band / 100
+        if abs(new - old) >= band:
+            return False
+        # other attributes are unchanged
+        return {**data, "native_value": old} == written
+
+    @callback
+    def _write_state(self, fingerprint: tuple[bool, Any]) -> None:
+        """Apply entity's data to its attributes and write the state."""
+        if self._deferred is not None:
+            self._deferred()
+            self._deferred = None
+        self._written_fingerprint = fingerprint
+        self._written_at = time.monotonic()
+        profiler = self.coordinator.profiler
+        with (
+            profiler.span(f"update {self.entity_id}", self.coordinator.name)
+            if profiler
+            else nullcontext()
+        ):
+            self.update_entity()
+            super()._handle_coordinator_update()
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Cancel deferred write."""
+        if self._deferred is not None:
+            self._deferred()
+            self._deferred = None
+        await super().async_will_remove_from_hass()
+
+
+def _isNumber(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+
+def _parseDeadband(key: str, v: Any) -> tuple[float, bool] | None:
+    """Parse spec's deadband, number or "<number>%", into (deadband, is percent).
+
+    Invalid value is logged and ignored, the entity writes every change.
+    """
+    if v is None:
+        return None
+    try:
+        if isinstance(v, str) and v.strip().endswith("%"):
+            return float(v.strip()[:-1]), True
+        return float(v), False
+    except (TypeError, ValueError):
+        _LOGGER.warning("Ignoring invalid %s %r of %s", SPEC_DEADBAND, v, key)
+        return None
+
+
+def _parseMinInterval(key: str, v: Any) -> float:
+    """Parse spec's min_interval seconds, invalid value is logged and taken as 0."""
+    if v is None:
+        return 0
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        _LOGGER.warning("Ignoring invalid %s %r of %s", SPEC_MIN_INTERVAL, v, key)
+        return 0
+
 
 def instrument_update(e: NMBaseEntity) -> None:
-    """Set up device update callback for the entity and reads/loads initial values (data)."""
+    """Read/load initial values (data) of the entity.
 
-    e.coordinator.async_add_listener(e.update_entity)
+    Later updates come via coordinator listener, registered when added to hass.
+    """
 
     # set values right after creation
     e.update_entity()
+    # state of these values is written once the entity is added to hass
+    e.mark_written()
 
 
 async def send_state(e: NMBaseEntity, payload: dict[str, Any]) -> None:
-    """Send update request to the device."""
-    await update_device_data(
-        e.coordinator.conn, deepdict(e.entity_description.key, payload)
-    )
-    await e.coordinator.async_request_refresh()
+    """Send update request to the device.
+
+    Writes of entities of the same device are batched together,
+    followed by single data refresh. Superseded writes of the entity are dropped.
+    Optimistic entities skip the refresh and apply the payload locally instead.
+    """
+    optimistic = e.optimistic
+    profiler = e.coordinator.profiler
+    with (
+        profiler.span(f"send_state {e.entity_id}", e.coordinator.name)
+        if profiler
+        else nullcontext()
+    ):
+        await e.coordinator.writer.async_write(e.key_path, payload, not optimistic)
+        if optimistic:
+            e.coordinator.async_apply_written(e.key_path, payload)
@@ -1,6 +1,7 @@
 """The module contains the implementation of the NodeMCU humidifier component."""
 
-from typing import Any
+from enum import IntFlag
+from typing import Any, ClassVar
 
 from homeassistant.components.humidifier import (
     HumidifierEntity,
@@ -14,12 +15,15 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from .const import DOMAIN
 from .coordinator import NMDeviceCoordinator
 from .entity import NMBaseEntity, instrument_update, send_state
-from .utils import int_to_enum
 
 
 class NMEntityHumidifier(NMBaseEntity, HumidifierEntity):
     """Representation of a NodeMCU sensor."""
 
+    enum_attrs: ClassVar[dict[str, type[IntFlag]]] = {
+        "supported_features": HumidifierEntityFeature
+    }
+
     async def async_set_humidity(self, humidity: int) -> None:  # noqa: D102
         await send_state(self, {"target_humidity": humidity})
 
@@ -32,12 +36,6 @@ class NMEntityHumidifier(NMBaseEntity, HumidifierEntity):
     async def async_turn_off(self, **kwargs: Any) -> None:  # noqa: D102
         await send_state(self, {"is_on": False})
 
-    def on_update(self, tbl: dict[str, Any]) -> dict[str, Any]:  # noqa: D102
-        if tbl.get("supported_features") is None:
-            return tbl
-        e = int_to_enum(tbl["supported_features"], HumidifierEntityFeature)
-        return {**tbl, "supported_features": e}
-
 
 def _newEntity(
     coordinator: NMDeviceCoordinator, spec: dict[str, Any]
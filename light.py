@@ -1,6 +1,7 @@
 """The module contains the NMEntityLight class and related functions for NodeMCU light integration."""
 
-from typing import Any
+from enum import IntFlag
+from typing import Any, ClassVar
 
 from homeassistant.components.light import (
     LightEntity,
@@ -14,12 +15,15 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 from .const import DOMAIN
 from .coordinator import NMDeviceCoordinator
 from .entity import NMBaseEntity, instrument_update, send_state
-from .utils import int_to_enum
 
 
 class NMEntityLight(NMBaseEntity, LightEntity):
     """Representation of a NodeMCU sensor."""
 
+    enum_attrs: ClassVar[dict[str, type[IntFlag]]] = {
+        "supported_features": LightEntityFeature
+    }
+
     async def _setOnOff(self, flg: bool, params: dict[str, Any]):
         o = {"is_on": flg, **params}
         await send_state(self, o)
@@ -30,12 +34,6 @@ class NMEntityLight(NMBaseEntity, LightEntity):
     async def async_turn_on(self, **kwargs: Any) -> None:  # noqa: D102
         await self._setOnOff(True, kwargs)
 
-    def on_update(self, tbl: dict[str, Any]) -> dict[str, Any]:  # noqa: D102
-        if tbl.get("supported_features") is None:
-            return tbl
-        e = int_to_enum(tbl["supported_features"], LightEntityFeature)
-        return {**tbl, "supported_features": e}
-
 
 def _newEntity(coordinator: NMDeviceCoordinator, spec: dict[str, Any]) -> NMEntityLight:
     desc = LightEntityDescription(**spec)
@@ -1,29 +1,61 @@
 """Mediation talking to NodeMCU."""
 
+import asyncio
+from collections.abc import Callable, Mapping
 import hashlib
 import json
+import logging
+import time
 from typing import Any, Final
-
-from requests import Session
-from requests.adapters import HTTPAdapter
-from requests.auth import HTTPBasicAuth
+from urllib.parse import quote
+import zlib
+
+from aiohttp import (
+    BasicAuth,
+    ClientConnectionError,
+    ClientConnectorError,
+    ClientError,
+    ClientSession,
+    ClientTimeout,
+    ClientWebSocketResponse,
+    TCPConnector,
+    WSMsgType,
+    WSServerHandshakeError,
+)
 
 from homeassistant.core import HomeAssistant
 
+from .breaker import NMCircuitBreaker, NMRetryBudget, backoff
+from .codec import ACCEPT, CONTENT_JSON, decode, encode, media_type
 from .const import (
     CONF_APIPATH,
     CONF_HOST,
     CONF_PORT,
     CONF_PROTOCOL,
     CONF_PWD,
+    CONF_RETRIES,
+    CONF_TIMEOUT_CONNECT,
+    CONF_TIMEOUT_READ,
     CONF_USR,
+    DEFAULT_RETRIES,
+    DEFAULT_TIMEOUT_CONNECT,
+    DEFAULT_TIMEOUT_READ,
+    SPEC_DEVICE,
     CannotConnect,
     InvalidAuth,
     NodeMCUDeviceException,
 )
+from .telemetry import NMTelemetry
 from .test_data import DummyDeviceData, DummyDeviceInfo, DummyDeviceSpec
+from .utils import escape_key
 
-headers: Final = {"Content-Type": "application/json", "User-Agent": "hass-nodemcu"}
+headers: Final = {
+    "Content-Type": CONTENT_JSON,
+    "Accept": ACCEPT,
+    # decoded by _decompress, to measure the transfer as sent over the wire
+    "Accept-Encoding": "gzip, deflate",
+    "User-Agent": "hass-nodemcu",
+}
 
 # Built-in host name, which if provided as NodeMCU "host" value
 # it will fake the http calls and return test_data.py definitions instead.
@@ -31,10 +63,42 @@ headers: Final = {"Content-Type": "application/json", "User-Agent": "hass-nodemc
 # without using actual NodeMCU device.
 stubHost: Final = "stub"
 
+_LOGGER = logging.getLogger(__name__)
+
+# ESP8266 serves one request at a time, more sockets just queue on the device
+connPoolSize: Final = 2
+# seconds an idle socket is kept open for reuse by the next poll or post
+connKeepAlive: Final = 60
+
+# seconds between websocket pings, detecting silently dropped device
+wsHeartbeat: Final = 30
+# seconds to wait for the device to acknowledge a write sent over websocket
+wsAckTimeout: Final = 10
+
+# seconds added to long-poll wait, to let the device answer before request times out
+longPollMargin: Final = 15
+
+
+# the json payload from /data endpoint.
+NMDeviceData = dict[str, Any]
+"""Convenience type for references here and there"""
+
+
+class NMTransferStats:
+    """Transfer statistics of single endpoint, accumulated over all its requests."""
 
-# an http client session with retries to ensure unreliable network
-cl = Session()
-cl.mount("http://", HTTPAdapter(max_retries=5))
+    requests: int = 0
+    # bytes received over the wire, and after decompression
+    wire_bytes: int = 0
+    body_bytes: int = 0
+    # seconds from sending the request until the whole body is received
+    seconds: float = 0
+    last_seconds: float = 0
+
+    @property
+    def ratio(self) -> float:
+        """Compression ratio, 1 if responses are not compressed."""
+        return self.body_bytes / self.wire_bytes if self.wire_bytes else 1
 
 
 class NMConnection:
@@ -54,21 +118,57 @@ class NMConnection:
     # http request headers
     headers: dict[str, str]
     # authentication obj
-    auth: HTTPBasicAuth | None
-
-
-# the json payload from /data endpoint.
-NMDeviceData = dict[str, Any]
-"""Convenience type for references here and there"""
-
-
-def newNMConnection(hass: HomeAssistant, data: dict[str, Any]) -> NMConnection:
+    auth: BasicAuth | None
+
+    # per-device http session, holding its own keep-alive connection pool.
+    # created lazily inside the event loop, see _session()
+    session: ClientSession | None
+    # connect and read timeouts of each request
+    timeout: ClientTimeout
+    # attempts per request, retries cover unreliable network and the device
+    # dropping an idle keep-alive socket
+    max_attempts: int
+    retry_budget: NMRetryBudget
+    breaker: NMCircuitBreaker
+
+    # validators of the last /data response, echoed back as conditional GET
+    data_etag: str | None
+    data_last_modified: str | None
+    # the last /data payload, returned again when device answers 304
+    data_cache: NMDeviceData | None
+    # sequence number of the last /data payload (X-Seq header), long-poll cursor
+    data_seq: str | None
+    # media type the device answers /data with, used for POST /data as well
+    data_content_type: str
+    # transfer statistics per endpoint (path without query)
+    transfer_stats: dict[str, NMTransferStats]
+    # rolling request, decode and fan-out timings
+    telemetry: NMTelemetry
+    # if device honors "GET /data?keys=...", None until known
+    partial_reads: bool | None
+    # if the device is a hub (gateway), aggregating many child devices
+    hub: bool
+
+    # open websocket to the device, when websocket transport is connected
+    ws: ClientWebSocketResponse | None
+    # writes sent over the websocket waiting for device's ack, per request id
+    ws_acks: dict[int, asyncio.Future[None]]
+    ws_next_id: int
+
+
+def newNMConnection(hass: HomeAssistant, data: Mapping[str, Any]) -> NMConnection:
     """Create new prepared connection out of URI."""
 
     base_url = f"{data[CONF_PROTOCOL]}://{data[CONF_HOST]}:{data[CONF_PORT]}{data[CONF_APIPATH]}"
-    return _newNMConnection(
+    c = _newNMConnection(
         hass, data[CONF_HOST], base_url, data.get(CONF_USR), data.get(CONF_PWD)
     )
+    c.timeout = ClientTimeout(
+        connect=data.get(CONF_TIMEOUT_CONNECT, DEFAULT_TIMEOUT_CONNECT),
+        sock_read=data.get(CONF_TIMEOUT_READ, DEFAULT_TIMEOUT_READ),
+    )
+    c.max_attempts = 1 + data.get(CONF_RETRIES, DEFAULT_RETRIES)
+    return c
 
 
 def _newNMConnection(
@@ -80,7 +180,28 @@ def _newNMConnection(
     c.hostname = hostname
     c.url_base = baseUrl
     c.headers = {"Content-Type": "application/json"}
-    c.auth = None if not usr else HTTPBasicAuth(usr, pwd)
+    c.auth = None if not usr else BasicAuth(usr, pwd or "")
+    c.session = None
+    c.timeout = ClientTimeout(
+        connect=DEFAULT_TIMEOUT_CONNECT, sock_read=DEFAULT_TIMEOUT_READ
+    )
+    c.max_attempts = 1 + DEFAULT_RETRIES
+    c.retry_budget = NMRetryBudget()
+    c.breaker = NMCircuitBreaker()
+
+    c.data_etag = None
+    c.data_last_modified = None
+    c.data_cache = None
+    c.data_seq = None
+    c.data_content_type = CONTENT_JSON
+    c.transfer_stats = {}
+    c.telemetry = NMTelemetry()
+    c.partial_reads = None
+    c.hub = False
+
+    c.ws = None
+    c.ws_acks = {}
+    c.ws_next_id = 0
 
     c.generated_unique_id = hashlib.md5(c.url_base.encode()).hexdigest()
     c.entity_id = hashlib.md5(c.hostname.encode()).hexdigest()
@@ -88,43 +209,332 @@ def _newNMConnection(
     return c
 
 
-def _doGetLowLevel(conn: NMConnection, subPath: str) -> dict[str, Any]:
-    """Run GET against the device."""
+def _session(conn: NMConnection) -> ClientSession:
+    """Return device's http session, creating it on first use."""
+    if conn.session is None or conn.session.closed:
+        conn.session = ClientSession(
+            connector=TCPConnector(
+                limit=connPoolSize,
+                keepalive_timeout=connKeepAlive,
+            ),
+            headers=headers,
+            auth=conn.auth,
+            auto_decompress=False,
+        )
+    return conn.session
+
+
+async def close_connection(conn: NMConnection) -> None:
+    """Release device's http session and its pooled sockets."""
+    if conn.session is not None:
+        await conn.session.close()
+        conn.session = None
+
+
+async def _doRequest(
+    conn: NMConnection,
+    method: str,
+    u: str,
+    reqHeaders: dict[str, str] | None = None,
+    timeout: ClientTimeout | None = None,
+    data: bytes | None = None,
+) -> tuple[int, Mapping[str, str], bytes]:
+    """Run request against the device, returning status, headers and raw body.
+
+    Failed requests are retried with jittered exponential backoff, as long as
+    the retry budget allows. GET is retried on connection errors and timeouts,
+    POST only if connecting failed (ClientConnectorError), as otherwise the device
+    may have already applied it. 5xx answers count as failures of the device,
+    they are returned but not retried.
+    While device's circuit breaker is open, it fails immediately.
+    """
+    if not conn.breaker.allow():
+        raise CannotConnect(f"{u} : device is down, circuit breaker is open")
+    attempt = 0
+    while True:
+        start = time.monotonic()
+        try:
+            async with _session(conn).request(
+                method,
+                u,
+                headers=reqHeaders,
+                timeout=timeout or conn.timeout,
+                data=data,
+            ) as resp:
+                wire = await resp.read()
+                elapsed = time.monotonic() - start
+                if resp.status >= 500:
+                    # device is answering, but is broken
+                    conn.breaker.failure()
+                    conn.telemetry.record_failure()
+                else:
+                    conn.breaker.success()
+                    conn.retry_budget.deposit()
+                if resp.status == 401:
+                    raise InvalidAuth()
+                try:
+                    body = _decompress(resp.headers.get("Content-Encoding"), wire)
+                except zlib.error as ex:
+                    raise NodeMCUDeviceException(method, u, ex) from ex
+                _recordTransfer(conn, u, len(wire), len(body), elapsed)
+                return resp.status, resp.headers, body
+        except (ClientConnectionError, TimeoutError) as ex:
+            attempt += 1
+            if (
+                attempt >= conn.max_attempts
+                or (method != "GET" and not isinstance(ex, ClientConnectorError))
+                or not conn.retry_budget.withdraw()
+            ):
+                conn.breaker.failure()
+                conn.telemetry.record_failure()
+                raise CannotConnect(ex) from ex
+            conn.telemetry.record_retry()
+            await asyncio.sleep(backoff(attempt))
+        except ClientError as ex:
+            conn.breaker.failure()
+            conn.telemetry.record_failure()
+            raise CannotConnect(ex) from ex
+
+
+def _decompress(encoding: str | None, body: bytes) -> bytes:
+    """Decompress response body as per its Content-Encoding.
+
+    Gzip body is recognized also without the header, for pre-compressed
+    static files (typically /spec) served as-is from device's flash.
+    """
+    encoding = (encoding or "").strip().lower()
+    if encoding in ("gzip", "x-gzip") or body[:2] == b"\x1f\x8b":
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == "deflate":
+        # zlib wrapped as per RFC, but some servers send raw deflate stream
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def _recordTransfer(
+    conn: NMConnection, u: str, wire: int, body: int, elapsed: float
+) -> None:
+    """Account the response into its endpoint's transfer statistics."""
+    endpoint = u[len(conn.url_base) :].split("?", 1)[0]
+    stats = conn.transfer_stats.get(endpoint)
+    if stats is None:
+        stats = conn.transfer_stats[endpoint] = NMTransferStats()
+    stats.requests += 1
+    stats.wire_bytes += wire
+    stats.body_bytes += body
+    stats.seconds += elapsed
+    stats.last_seconds = elapsed
+    conn.telemetry.record_request(elapsed, wire)
+    _LOGGER.debug(
+        "%s : %d bytes (%d on wire, ratio %.1f) in %.3fs",
+        u,
+        body,
+        wire,
+        body / wire if wire else 1,
+        elapsed,
+    )
+
+
+async def _doGetLowLevel(
+    conn: NMConnection,
+    subPath: str,
+    reqHeaders: dict[str, str] | None = None,
+    timeout: ClientTimeout | None = None,
+) -> tuple[int, Mapping[str, str], Any]:
+    """Run GET against the device, returning status, headers and decoded body.
+
+    Body is decoded as per response's Content-Type, None for 304 Not Modified.
+    Other than 2xx status raises NodeMCUDeviceException.
+    """
     u = f"{conn.url_base}{subPath}"
+    status, respHeaders, body = await _doRequest(conn, "GET", u, reqHeaders, timeout)
+    if status == 304:
+        return status, respHeaders, None
+    if not 200 <= status < 300:
+        # error page is not device's answer
+        text = body.decode(errors="replace")
+        ex = ValueError(f"NodeMCU responsed with {status}:{text}")
+        raise NodeMCUDeviceException("GET", u, ex)
     try:
-        resp = cl.get(url=u, headers=headers, auth=conn.auth)
-        if resp.status_code == 401:
-            raise InvalidAuth()
-        return resp.json()
-    except ConnectionError as ex:
-        raise CannotConnect(ex) from ex
+        start = time.monotonic()
+        decoded = decode(media_type(respHeaders), body)
+        conn.telemetry.record_decode(time.monotonic() - start)
+        return status, respHeaders, decoded
     except ValueError as ex:
         raise NodeMCUDeviceException("GET", u, ex) from ex
 
 
 async def _doGet(conn: NMConnection, subPath: str) -> dict[str, Any]:
     """Run GET against the device."""
-    return await conn.hass.async_add_executor_job(_doGetLowLevel, conn, subPath)
+    _, _, body = await _doGetLowLevel(conn, subPath)
+    return body
 
 
-def _doPost(conn: NMConnection, data: dict[str, Any]) -> None:
-    u = f"{conn.url_base}/data"
+async def _doPost(
+    conn: NMConnection, data: dict[str, Any], subPath: str = "/data"
+) -> None:
+    u = f"{conn.url_base}{subPath}"
+    mime = conn.data_content_type
+    status, _, body = await _doRequest(
+        conn, "POST", u, {"Content-Type": mime}, data=encode(mime, data)
+    )
+    if status != 200:
+        text = body.decode(errors="replace")
+        ex = ValueError(f"NodeMCU responsed with {status}:{text}")
+        raise NodeMCUDeviceException("POST", u, data, ex)
+
+
+async def run_device_websocket(
+    conn: NMConnection, on_data: Callable[[NMDeviceData, bool], None]
+) -> None:
+    """Open websocket /ws and pass data pushed by the device to on_data.
+
+    on_data receives the data and a flag if it is full DeviceData or just a delta.
+    Returns when the device closes the socket, raises CannotConnect if cannot connect.
+    """
+    u = f"{conn.url_base}/ws"
     try:
-        resp = cl.post(url=u, headers=headers, auth=conn.auth, data=json.dumps(data))
-        if resp.status_code == 401:
-            raise InvalidAuth()
-        if resp.status_code != 200:
-            ex = ValueError(f"NodeMCU responsed with {resp.status_code}:{resp.text}")
-            raise NodeMCUDeviceException("POST", u, data, ex)
-    except ConnectionError as ex:
+        async with _session(conn).ws_connect(u, heartbeat=wsHeartbeat) as ws:
+            conn.ws = ws
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                _onWsMessage(conn, u, msg.data, on_data)
+    except WSServerHandshakeError as ex:
+        if ex.status == 401:
+            raise InvalidAuth() from ex
+        raise CannotConnect(ex) from ex
+    except ClientError as ex:
         raise CannotConnect(ex) from ex
+    finally:
+        conn.ws = None
+        acks, conn.ws_acks = conn.ws_acks, {}
+        for fut in acks.values():
+            if not fut.done():
+                fut.set_exception(CannotConnect(f"{u} closed"))
+
+
+def _onWsMessage(
+    conn: NMConnection,
+    u: str,
+    text: str,
+    on_data: Callable[[NMDeviceData, bool], None],
+) -> None:
+    """Dispatch single message received over websocket, malformed ones are ignored."""
+    try:
+        msg = json.loads(text)
+    except ValueError:
+        msg = None
+    if not isinstance(msg, dict):
+        _LOGGER.debug("%s : ignoring malformed message %.200s", u, text)
+        return
+    typ = msg.get("type")
+    if typ in ("data", "delta"):
+        if not isinstance(data := msg.get("data"), dict):
+            _LOGGER.debug("%s : ignoring %s message without data object", u, typ)
+            return
+        on_data(data, typ == "data")
+    elif typ == "ack":
+        fut = conn.ws_acks.pop(msg.get("id", -1), None)
+        if fut is None or fut.done():
+            return
+        if msg.get("status", 200) == 200:
+            fut.set_result(None)
+        else:
+            ex = ValueError(f"NodeMCU responsed with {msg.get('status')}:{msg}")
+            fut.set_exception(NodeMCUDeviceException("WS", u, ex))
+
+
+async def _doPostWs(
+    conn: NMConnection,
+    ws: ClientWebSocketResponse,
+    data: dict[str, Any],
+    child: str | None = None,
+) -> None:
+    """Send data over websocket and wait for device's ack.
+
+    Writes to hub's child carry its id, same as POST /hub/<child>/data.
+    """
+    conn.ws_next_id += 1
+    reqId = conn.ws_next_id
+    fut: asyncio.Future[None] = conn.hass.loop.create_future()
+    conn.ws_acks[reqId] = fut
+    msg: dict[str, Any] = {"type": "post", "id": reqId, "data": data}
+    if child is not None:
+        msg["child"] = child
+    try:
+        await ws.send_json(msg)
+        async with asyncio.timeout(wsAckTimeout):
+            await fut
+    except (ClientError, ConnectionResetError, TimeoutError) as ex:
+        raise CannotConnect(ex) from ex
+    finally:
+        conn.ws_acks.pop(reqId, None)
 
 
-async def read_device_data(conn: NMConnection) -> NMDeviceData:
-    """Read via GET /data endpoint."""
+async def read_device_data(
+    conn: NMConnection, wait: int | None = None
+) -> NMDeviceData:
+    """Read via GET /data endpoint.
+
+    With wait, it is a long-poll "GET /data?wait=<wait>&since=<seq>". The device
+    answers once its data changes after seq, or with 304 when wait expires.
+    """
     if conn.hostname == stubHost:
+        if wait:
+            # stub data never changes
+            await asyncio.sleep(wait)
         return DummyDeviceData
-    return await _doGet(conn, "/data")
+
+    subPath = "/data"
+    timeout = None
+    if wait:
+        subPath = f"/data?wait={wait}&since={conn.data_seq or ''}"
+        timeout = ClientTimeout(total=wait + longPollMargin)
+
+    # conditional GET, device answers 304 if data has not changed since last read
+    reqHeaders: dict[str, str] = {}
+    if conn.data_cache is not None:
+        if conn.data_etag:
+            reqHeaders["If-None-Match"] = conn.data_etag
+        if conn.data_last_modified:
+            reqHeaders["If-Modified-Since"] = conn.data_last_modified
+
+    status, respHeaders, body = await _doGetLowLevel(
+        conn, subPath, reqHeaders, timeout
+    )
+    if status == 304:
+        if conn.data_cache is None:
+            # nothing to answer "not modified" against, read the data unconditionally
+            return await read_device_data(conn)
+        # device's seq moves also with writes not changing the data,
+        # long-poll since older seq would be answered right away again
+        conn.data_seq = respHeaders.get("X-Seq", conn.data_seq)
+        # same object as before, coordinator sees no change and skips entities update
+        return conn.data_cache
+
+    conn.data_content_type = media_type(respHeaders)
+    conn.data_seq = respHeaders.get("X-Seq")
+    conn.data_etag = respHeaders.get("ETag")
+    conn.data_last_modified = respHeaders.get("Last-Modified")
+    conn.data_cache = body
+    return body
+
+
+async def read_device_data_keys(
+    conn: NMConnection, keys: list[str]
+) -> NMDeviceData:
+    """Read only some keys via GET /data?keys=<key1>,<key2> endpoint.
+
+    Device not supporting it would typically answer with full data.
+    """
+    if conn.hostname == stubHost:
+        return DummyDeviceData
+    # keys are separated by literal ",", a "," inside a key is escaped
+    return await _doGet(conn, f"/data?keys={','.join(quote(k, safe='') for k in keys)}")
 
 
 async def read_device_info(conn: NMConnection) -> dict[str, str]:
@@ -141,10 +551,48 @@ async def read_device_spec(conn: NMConnection) -> dict[str, Any]:
     return await _doGet(conn, "/spec")
 
 
+async def read_device_info_and_spec(
+    conn: NMConnection,
+) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Read device's info and spec.
+
+    If /info says the device is a hub, children's info and spec are read
+    at once via GET /hub. Children's info is returned in info "children",
+    their spec entries are merged into single spec with keys prefixed by child id.
+    """
+    info = await read_device_info(conn)
+    if not info.get("hub"):
+        return info, await read_device_spec(conn)
+
+    conn.hub = True
+    children: dict[str, dict[str, Any]] = await _doGet(conn, "/hub")
+    spec: dict[str, list[dict[str, Any]]] = {}
+    for child, content in children.items():
+        prefix = escape_key(child)
+        for platform, entries in content.get("spec", {}).items():
+            spec.setdefault(platform, []).extend(
+                {**e, "key": f"{prefix}.{e['key']}", SPEC_DEVICE: child}
+                for e in entries
+            )
+    childInfo = {child: content.get("info", {}) for child, content in children.items()}
+    return {**info, "children": childInfo}, spec
+
+
 async def update_device_data(conn: NMConnection, data: dict[str, Any]) -> None:
-    """Write POST data to /data endpoint."""
+    """Write POST data to /data endpoint, or over the websocket if connected."""
     if conn.hostname == stubHost:
         # stub hostname, print here your data or simply put a breakpoint
         # print(f"[NodeMCU stub] : POST /api/ha/data : {json.dumps(data)}")
         return None
-    return await conn.hass.async_add_executor_job(_doPost, conn, data)
+    ws = conn.ws if conn.ws is not None and not conn.ws.closed else None
+    if conn.hub:
+        # route the writes to each child device
+        for child, childData in data.items():
+            if ws is not None:
+                await _doPostWs(conn, ws, childData, child)
+            else:
+                await _doPost(conn, childData, f"/hub/{quote(child, safe='')}/data")
+        return None
+    if ws is not None:
+        return await _doPostWs(conn, ws, data)
+    return await _doPost(conn, data)
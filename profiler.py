@@ -0,0 +1,123 @@
+"""On-demand profiling of coordinator refreshes and entity writes."""
+
+import asyncio
+from collections.abc import Iterator
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime
+import json
+from pathlib import Path
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+
+
+class NMProfileSession:
+    """Profile of the next refresh cycles of some devices.
+
+    Collects cProfile stats of the event loop thread while the session runs,
+    and wall-clock spans of refreshes, listener fan-outs, entity updates and
+    writes. Both are written into the config directory once every profiled
+    device has done its refreshes, or when the session times out. Only
+    refreshes are counted, writes are profiled while the session runs:
+
+    - nodemcu_profile_<time>.prof, cProfile stats for pstats or snakeviz
+    - nodemcu_profile_<time>.trace.json, the spans in Chrome trace format,
+      to open with chrome://tracing or https://ui.perfetto.dev
+    """
+
+    hass: HomeAssistant
+    # refresh cycles left per profiled device (its config entry id)
+    remaining: dict[str, int]
+    profile: cProfile.Profile
+    # Chrome trace events, timestamps in microseconds since start
+    events: list[dict[str, Any]]
+    # trace ids per (0, device) and per (device's id, asyncio task name)
+    _ids: dict[tuple[int, str], int]
+    start: float
+    done: asyncio.Event
+
+    def __init__(self, hass: HomeAssistant, entryIds: list[str], count: int) -> None:
+        """Initialize the session, call async_start to begin profiling."""
+        self.hass = hass
+        self.remaining = dict.fromkeys(entryIds, count)
+        self.profile = cProfile.Profile()
+        self.events = []
+        self._ids = {}
+        self.start = 0
+        self.done = asyncio.Event()
+
+    @callback
+    def async_start(self) -> None:  # noqa: D102
+        self.start = time.perf_counter()
+        self.profile.enable()
+
+    @contextmanager
+    def span(self, name: str, device: str) -> Iterator[None]:
+        """Record wall-clock span of the block, nested spans are kept."""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            task = asyncio.current_task()
+            pid = self._traceId(device, 0)
+            tid = self._traceId(task.get_name() if task else "callbacks", pid)
+            self.events.append(
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (begin - self.start) * 1e6,
+                    "dur": (end - begin) * 1e6,
+                    "pid": pid,
+                    "tid": tid,
+                }
+            )
+
+    def _traceId(self, name: str, pid: int) -> int:
+        """Return trace id of device (pid=0) or task, adding event naming it."""
+        key = (pid, name)
+        if (i := self._ids.get(key)) is None:
+            i = self._ids[key] = len(self._ids) + 1
+            self.events.append(
+                {
+                    "name": "thread_name" if pid else "process_name",
+                    "ph": "M",
+                    "pid": pid or i,
+                    "tid": i,
+                    "args": {"name": name},
+                }
+            )
+        return i
+
+    @callback
+    def async_refresh_done(self, entryId: str) -> None:
+        """Count finished refresh of the device, ending the session after the last."""
+        left = self.remaining.get(entryId, 0) - 1
+        if left > 0:
+            self.remaining[entryId] = left
+        else:
+            self.remaining.pop(entryId, None)
+        if not self.remaining:
+            self.done.set()
+
+    async def async_run(self, timeout: float) -> list[Path]:
+        """Wait until the session is done or times out, then write its files."""
+        try:
+            await asyncio.wait_for(self.done.wait(), timeout)
+        except TimeoutError:
+            pass
+        finally:
+            self.profile.disable()
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        base = Path(self.hass.config.path(f"nodemcu_profile_{stamp}"))
+        return await self.hass.async_add_executor_job(self._write, base)
+
+    def _write(self, base: Path) -> list[Path]:
+        profPath = base.with_suffix(".prof")
+        tracePath = base.with_suffix(".trace.json")
+        self.profile.dump_stats(profPath)
+        with open(tracePath, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events}, f)
+        return [profPath, tracePath]
@@ -1,21 +1,134 @@
 """The module contains the sensor entity for the NodeMCU integration."""
 
+from collections.abc import Callable
+from dataclasses import dataclass
 from typing import Any
 
-from homeassistant.components.sensor import SensorEntity, SensorEntityDescription
+from homeassistant.components.sensor import (
+    SensorEntity,
+    SensorEntityDescription,
+    SensorStateClass,
+)
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.const import EntityCategory, UnitOfInformation, UnitOfTime
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
 from .const import DOMAIN
 from .coordinator import NMDeviceCoordinator
 from .entity import NMBaseEntity, instrument_update
+from .telemetry import percentile
 
 
 class NMEntitySensor(NMBaseEntity, SensorEntity):
     """Representation of a NodeMCU sensor."""
 
 
+@dataclass(frozen=True, kw_only=True)
+class NMDiagnosticSensorDescription(SensorEntityDescription):
+    """Describes device's telemetry sensor."""
+
+    value_fn: Callable[[NMDeviceCoordinator], float | int | None]
+
+
+def _ms(v: float | None) -> float | None:
+    return None if v is None else round(v * 1000, 1)
+
+
+DIAGNOSTIC_SENSORS: tuple[NMDiagnosticSensorDescription, ...] = (
+    NMDiagnosticSensorDescription(
+        key="latency_p50",
+        name="Request latency p50",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _ms(percentile(c.conn.telemetry.latency, 50)),
+    ),
+    NMDiagnosticSensorDescription(
+        key="latency_p95",
+        name="Request latency p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _ms(percentile(c.conn.telemetry.latency, 95)),
+    ),
+    NMDiagnosticSensorDescription(
+        key="payload_bytes",
+        name="Payload size",
+        native_unit_of_measurement=UnitOfInformation.BYTES,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: percentile(c.conn.telemetry.payload_bytes, 50),
+    ),
+    NMDiagnosticSensorDescription(
+        key="decode_p95",
+        name="Decode time p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _ms(percentile(c.conn.telemetry.decode_time, 95)),
+    ),
+    NMDiagnosticSensorDescription(
+        key="fanout_p95",
+        name="Entity update time p95",
+        native_unit_of_measurement=UnitOfTime.MILLISECONDS,
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: _ms(percentile(c.conn.telemetry.fanout_time, 95)),
+    ),
+    NMDiagnosticSensorDescription(
+        key="retries",
+        name="Request retries",
+        state_class=SensorStateClass.TOTAL_INCREASING,
+        value_fn=lambda c: c.conn.telemetry.retries,
+    ),
+    NMDiagnosticSensorDescription(
+        key="failure_streak",
+        name="Failed polls in a row",
+        state_class=SensorStateClass.MEASUREMENT,
+        value_fn=lambda c: c.failure_streak,
+    ),
+)
+
+
+class NMDiagnosticSensor(CoordinatorEntity[NMDeviceCoordinator], SensorEntity):
+    """Device's telemetry value, refreshed after each coordinator refresh."""
+
+    entity_description: NMDiagnosticSensorDescription
+    _attr_has_entity_name = True
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+    _attr_entity_registry_enabled_default = False
+
+    def __init__(
+        self,
+        coordinator: NMDeviceCoordinator,
+        description: NMDiagnosticSensorDescription,
+    ) -> None:
+        """Initialize the sensor."""
+        super().__init__(coordinator)
+        self.entity_description = description
+        self._attr_unique_id = (
+            f"{coordinator.conf_entry.unique_id} diagnostic {description.key}"
+        )
+        self._attr_device_info = coordinator.device_info
+
+    async def async_added_to_hass(self) -> None:
+        """Listen for telemetry updates, sent after every refresh."""
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            self.coordinator.async_add_diagnostic_listener(self.async_write_ha_state)
+        )
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Skip data updates, telemetry updates follow them with fanout recorded."""
+
+    @property
+    def available(self) -> bool:
+        """Telemetry is available also while the device is not."""
+        return True
+
+    @property
+    def native_value(self) -> float | int | None:  # noqa: D102
+        return self.entity_description.value_fn(self.coordinator)
+
+
 def _newEntity(
     coordinator: NMDeviceCoordinator, spec: dict[str, Any]
 ) -> NMEntitySensor:
@@ -39,3 +152,6 @@ async def async_setup_entry(
             for s in coordinator.read_device_spec.get("sensor", {})
         ]
     )
+    async_add_entities(
+        NMDiagnosticSensor(coordinator, d) for d in DIAGNOSTIC_SENSORS
+    )
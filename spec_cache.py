@@ -0,0 +1,112 @@
+"""Persistent cache of device's /info and /spec, for fast start-up."""
+
+import asyncio
+from logging import Logger
+from typing import Any, Final
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, CannotConnect, InvalidAuth, NodeMCUDeviceException
+from .mediation import NMConnection, read_device_info, read_device_info_and_spec
+
+STORAGE_VERSION: Final = 1
+
+# seconds between attempts to revalidate the cache if device is unreachable
+REVALIDATE_RETRY: Final = 60
+
+
+def _store(hass: HomeAssistant, entry: ConfigEntry) -> Store[dict[str, Any]]:
+    return Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+
+
+async def async_load_cached(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    conn: NMConnection,
+    swVersion: str | None = None,
+) -> tuple[dict[str, str], dict[str, Any]] | None:
+    """Return cached (info, spec) of the device, None if nothing valid is cached.
+
+    Cache is keyed by device's unique id and, if swVersion is given,
+    by its firmware version too.
+    """
+    cached = await _store(hass, entry).async_load()
+    if (
+        not cached
+        or cached.get("unique_id") != conn.generated_unique_id
+        or (swVersion is not None and cached.get("swVersion") != swVersion)
+        or "info" not in cached
+        or "spec" not in cached
+    ):
+        return None
+    return cached["info"], cached["spec"]
+
+
+async def async_save_cached(
+    hass: HomeAssistant,
+    entry: ConfigEntry,
+    conn: NMConnection,
+    info: dict[str, str],
+    spec: dict[str, Any],
+) -> None:
+    """Store last good (info, spec) of the device."""
+    await _store(hass, entry).async_save(
+        {
+            "unique_id": conn.generated_unique_id,
+            "swVersion": info.get("swVersion"),
+            "info": info,
+            "spec": spec,
+        }
+    )
+
+
+async def async_remove_cached(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Drop the cache of removed device."""
+    await _store(hass, entry).async_remove()
+
+
+async def async_revalidate(
+    hass: HomeAssistant,
+    logger: Logger,
+    entry: ConfigEntry,
+    conn: NMConnection,
+    info: dict[str, str],
+    spec: dict[str, Any],
+) -> None:
+    """Re-read /info and /spec from the device and reload the entry if these changed.
+
+    If device's /info reports the cached firmware version, /spec is not read again.
+    Hubs are always read again with /hub, their children come and go without
+    a firmware change.
+    Retries until the device answers, meant to run as entry's background task.
+    Stops if the device rejects the credentials.
+    """
+    while True:
+        try:
+            current = await read_device_info(conn)
+            swVersion = current.get("swVersion")
+            if (
+                not current.get("hub")
+                and swVersion is not None
+                and await async_load_cached(hass, entry, conn, swVersion)
+            ):
+                return
+            newInfo, newSpec = await read_device_info_and_spec(conn)
+            break
+        except (CannotConnect, NodeMCUDeviceException) as ex:
+            logger.debug("Revalidating cached spec of %s failed: %s", conn.hostname, ex)
+            await asyncio.sleep(REVALIDATE_RETRY)
+        except InvalidAuth:
+            logger.warning(
+                "Device %s rejected the credentials, cached spec is not revalidated",
+                conn.hostname,
+            )
+            return
+
+    if newInfo == info and newSpec == spec:
+        return
+    logger.info("Device %s info or spec has changed, reloading", conn.hostname)
+    await async_save_cached(hass, entry, conn, newInfo, newSpec)
+    hass.config_entries.async_schedule_reload(entry.entry_id)
@@ -0,0 +1,82 @@
+"""Per-device performance telemetry, rolling window of recent samples."""
+
+from collections import deque
+from collections.abc import Collection
+from typing import Any, Final
+
+# samples kept per metric
+WINDOW: Final = 100
+
+
+def percentile(samples: Collection[float], p: float) -> float | None:
+    """Return p-th percentile (0..100) of the samples, None if there are none."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[min(int(len(ordered) * p / 100), len(ordered) - 1)]
+
+
+class NMTelemetry:
+    """Recent request, decode and entity fan-out timings of single device."""
+
+    # seconds from sending the request until the whole body is received
+    latency: deque[float]
+    # bytes of non-empty responses, as received over the wire
+    payload_bytes: deque[int]
+    # seconds spent decoding response bodies
+    decode_time: deque[float]
+    # seconds spent notifying entities of new data
+    fanout_time: deque[float]
+
+    requests: int
+    retries: int
+    failures: int
+
+    def __init__(self) -> None:
+        """Initialize empty telemetry."""
+        self.latency = deque(maxlen=WINDOW)
+        self.payload_bytes = deque(maxlen=WINDOW)
+        self.decode_time = deque(maxlen=WINDOW)
+        self.fanout_time = deque(maxlen=WINDOW)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+
+    def record_request(self, seconds: float, wire: int) -> None:  # noqa: D102
+        self.requests += 1
+        self.latency.append(seconds)
+        if wire:
+            # not counting empty 304 Not Modified answers
+            self.payload_bytes.append(wire)
+
+    def record_decode(self, seconds: float) -> None:  # noqa: D102
+        self.decode_time.append(seconds)
+
+    def record_fanout(self, seconds: float) -> None:  # noqa: D102
+        self.fanout_time.append(seconds)
+
+    def record_retry(self) -> None:  # noqa: D102
+        self.retries += 1
+
+    def record_failure(self) -> None:  # noqa: D102
+        self.failures += 1
+
+    def summary(self) -> dict[str, Any]:
+        """Return rolling summary, times in milliseconds."""
+
+        def ms(v: float | None) -> float | None:
+            return None if v is None else round(v * 1000, 2)
+
+        return {
+            "requests": self.requests,
+            "retries": self.retries,
+            "failures": self.failures,
+            "latency_p50_ms": ms(percentile(self.latency, 50)),
+            "latency_p95_ms": ms(percentile(self.latency, 95)),
+            "payload_bytes_p50": percentile(self.payload_bytes, 50),
+            "payload_bytes_max": max(self.payload_bytes, default=None),
+            "decode_p50_ms": ms(percentile(self.decode_time, 50)),
+            "decode_p95_ms": ms(percentile(self.decode_time, 95)),
+            "fanout_p50_ms": ms(percentile(self.fanout_time, 50)),
+            "fanout_p95_ms": ms(percentile(self.fanout_time, 95)),
+        }
@@ -0,0 +1,83 @@
+"""Synthetic devices with any number of entities, in the shape of test_data.py.
+
+Shared by the device simulator (test_web_srv.py) and benchmarks.
+"""
+
+import copy
+from typing import Any
+
+import test_data
+
+# per platform: (DeviceSpec entry, DeviceData entry, mutation of the data per round)
+templates: dict[str, tuple[dict[str, Any], dict[str, Any], Any]] = {
+    "sensor": (
+        test_data.DummyDeviceSpec["sensor"][0],
+        test_data.DummyDeviceData["inA0"],
+        lambda tbl, r: {**tbl, "native_value": r % 100},
+    ),
+    "binary_sensor": (
+        test_data.DummyDeviceSpec["binary_sensor"][0],
+        test_data.DummyDeviceData["inD2"],
+        lambda tbl, r: {**tbl, "is_on": bool(r % 2)},
+    ),
+    "switch": (
+        test_data.DummyDeviceSpec["switch"][0],
+        test_data.DummyDeviceData["outD4"],
+        lambda tbl, r: {**tbl, "is_on": bool(r % 2)},
+    ),
+    "climate": (
+        test_data.DummyDeviceSpec["climate"][0],
+        test_data.DummyDeviceData["thermostat1"],
+        lambda tbl, r: {**tbl, "current_temperature": 15 + r % 10},
+    ),
+    "light": (
+        test_data.DummyDeviceSpec["light"][0],
+        test_data.DummyDeviceData["lightD6"],
+        lambda tbl, r: {**tbl, "brightness": r % 256},
+    ),
+    "button": (
+        test_data.DummyDeviceSpec["button"][0],
+        {},
+        lambda tbl, r: tbl,
+    ),
+    "humidifier": (
+        test_data.DummyDeviceSpec["humidifier"][0],
+        test_data.DummyDeviceData["humidifier1"],
+        lambda tbl, r: {**tbl, "current_humidity": r % 100},
+    ),
+}
+
+
+def buildDevice(entities: int) -> tuple[dict[str, Any], dict[str, Any]]:
+    """Build synthetic (spec, data) with entities spread across all platforms."""
+    spec: dict[str, list[dict[str, Any]]] = {}
+    data: dict[str, Any] = {}
+    platforms = list(templates)
+    for i in range(entities):
+        platform = platforms[i % len(platforms)]
+        specTpl, dataTpl, _ = templates[platform]
+        key = f"{platform}{i}"
+        spec.setdefault(platform, []).append(
+            {**specTpl, "key": key, "name": f"{specTpl['name']} {i}"}
+        )
+        data[key] = copy.deepcopy(dataTpl)
+    return spec, data
+
+
+def mutated(
+    spec: dict[str, Any], data: dict[str, Any], r: int, changed: float
+) -> dict[str, Any]:
+    """Return new DeviceData, with values of the changed share of entities changed.
+
+    Data of unchanged entities is the same object, as after a real poll.
+    """
+    step = max(round(1 / changed), 1) if changed > 0 else 0
+    newData = {**data}
+    i = 0
+    for platform, entries in spec.items():
+        mutate = templates[platform][2]
+        for e in entries:
+            if step and (i + r) % step == 0:
+                newData[e["key"]] = mutate(data[e["key"]], r)
+            i += 1
+    return newData
@@ -1,80 +1,374 @@
 #!/usr/bin/env python3
 
-# Test server, one can start manually and use it to test integrate against test_data.py using http://localhost:8080/api URI.
+# Simulator of NodeMCU devices, one can start manually and use it to test
+# the integration. By default it hosts single device serving test_data.py
+# at http://localhost:8080/api URI.
+#
+# It can host many virtual devices for load-testing, each on its own port
+# (http://localhost:<port + i>/api) or under path prefix on single port
+# (http://localhost:<port>/dev<i>/api), see --help.
+# Each device supports everything the integration can use:
+#   - GET /info, /spec, /data, POST /data; POSTed deltas are applied to device's state
+#   - ETag conditional GET, partial GET /data?keys=, long-poll /data?wait=&since=
+#   - WebSocket /ws pushing data changes
+#   - hub mode (--children) with GET /hub and POST /hub/<child>/data
+#   - Json, CBOR or MessagePack as per Accept header (binary encodings only
+#     if cbor2 / msgpack are installed), gzip as per Accept-Encoding and
+#     /spec served as pre-compressed static blob, like from device's flash
+# Responses can be slowed down (--latency, --jitter) or fail (--fail-rate,
+# --timeout-rate), values of some entities change every few seconds
+# (--mutate, --mutate-ratio).
+# Run with --compare to print payload size and decode time of each encoding.
+# Requires aiohttp (part of HomeAssistant installation).
 
-# Python 3 server example
-from http import HTTPStatus
-from http.server import BaseHTTPRequestHandler, HTTPServer
+import argparse
+import asyncio
+import copy
+import gzip
+import hashlib
 import json
 import logging
+import random
+import timeit
 from typing import Any
 
+from aiohttp import WSMsgType, web
+
 import test_data
+from test_devices import buildDevice
+from utils import KeyPath, deep_merge
 
-logging.basicConfig(level=logging.INFO)
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
 
 hostName = "localhost"
 serverPort = 8080
+# smaller responses are not worth compressing
+compressMin = 256
+
+# (encode, decode) per media type
+codecs: dict[str, tuple[Any, Any]] = {
+    "application/json": (lambda o: bytes(json.dumps(o), "utf-8"), json.loads)
+}
+if cbor2 is not None:
+    codecs["application/cbor"] = (cbor2.dumps, cbor2.loads)
+if msgpack is not None:
+    codecs["application/msgpack"] = (msgpack.packb, msgpack.unpackb)
+
+
+def pickMediaType(accept: str | None) -> str:
+    """Return the supported media type with highest q in Accept header."""
+    best, bestQ = "application/json", 0.0
+    for part in (accept or "").split(","):
+        mime, _, params = part.strip().partition(";")
+        q = 1.0
+        if params.strip().startswith("q="):
+            q = float(params.strip()[2:])
+        if mime.strip() in codecs and q > bestQ:
+            best, bestQ = mime.strip(), q
+    return best
+
+
+def encodeResponse(
+    request: web.Request, data: Any, status: int = 200, **headers: str
+) -> web.Response:
+    """Encode data as per request's Accept and Accept-Encoding headers."""
+    mime = pickMediaType(request.headers.get("Accept"))
+    dt = codecs[mime][0](data)
+    etag = f'"{hashlib.md5(dt).hexdigest()}"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag, **headers})
+    hdrs = {"Content-Type": mime, "ETag": etag, **headers}
+    if len(dt) >= compressMin and "gzip" in request.headers.get("Accept-Encoding", ""):
+        dt = gzip.compress(dt)
+        hdrs["Content-Encoding"] = "gzip"
+    return web.Response(status=status, body=dt, headers=hdrs)
+
+
+async def decodeRequest(request: web.Request) -> Any:
+    """Decode request body as per its Content-Type."""
+    mime = request.headers.get("Content-Type", "application/json").split(";")[0]
+    return codecs.get(mime, codecs["application/json"])[1](await request.read())
+
 
+def mutateEntity(tbl: dict[str, Any]) -> dict[str, Any] | None:
+    """Return delta changing entity's value, None if nothing to change."""
+    for k in ("native_value", "current_temperature", "current_humidity", "brightness"):
+        if isinstance(tbl.get(k), (int, float)) and not isinstance(tbl[k], bool):
+            return {k: tbl[k] + random.choice((-1, 1))}
+    if isinstance(tbl.get("is_on"), bool):
+        return {"is_on": not tbl["is_on"]}
+    return None
 
-class MyServer(BaseHTTPRequestHandler):  # noqa: D101
-    def sendJsonObj(self, data: dict[str, Any]) -> None:  # noqa: D102
-        dt = bytes(json.dumps(data), "utf-8")
-        self.send_response(200)
-        self.send_header("Content-Type", "application/json")
-        self.send_header("Content-Length", str(len(dt)))
-        self.end_headers()
-        self.wfile.write(dt)
-
-    def readJsonObj(self):  # noqa: D102
-        o = self.rfile.read(int(self.headers["Content-Length"]))
-        logging.info(o)
-
-    def doAny(self):  # noqa: D102
-        if self.command == "GET" and self.path == "/api/info":
-            self.sendJsonObj(test_data.DummyDeviceInfo)
-        elif self.command == "GET" and self.path == "/api/spec":
-            self.sendJsonObj(test_data.DummyDeviceSpec)
-        elif self.command == "GET" and self.path == "/api/data":
-            self.sendJsonObj(test_data.DummyDeviceData)
-        elif self.command == "POST" and self.path == "/api/data":
-            self.readJsonObj()
-            self.send_response(200)
-            self.end_headers()
+
+class VirtualDevice:
+    """Single simulated device, or a hub with its children."""
+
+    name: str
+    info: dict[str, Any]
+    spec: dict[str, Any]
+    # current DeviceData, {child: DeviceData} for a hub
+    state: dict[str, Any]
+    children: dict[str, "VirtualDevice"]
+    # pre-compressed /spec, as it would be stored in device's flash
+    specBlob: bytes
+    # data sequence number, incremented with each change, and long-poll wake-up
+    seq: int
+    changed: asyncio.Condition
+    sockets: set[web.WebSocketResponse]
+
+    def __init__(self, name: str, entities: int, children: int = 0) -> None:
+        """Initialize device state, synthetic spec and data if entities > 0."""
+        self.name = name
+        self.info = {**test_data.DummyDeviceInfo, "name": name}
+        self.children = {
+            f"{name}-node{i}": VirtualDevice(f"{name}-node{i}", entities)
+            for i in range(children)
+        }
+        if self.children:
+            self.info["hub"] = True
+            self.spec = {}
+            self.state = {n: c.state for n, c in self.children.items()}
+        elif entities:
+            self.spec, self.state = buildDevice(entities)
         else:
-            self.send_response(404)
+            self.spec = copy.deepcopy(test_data.DummyDeviceSpec)
+            self.state = copy.deepcopy(test_data.DummyDeviceData)
+        self.specBlob = gzip.compress(bytes(json.dumps(self.spec), "utf-8"))
+        self.seq = 0
+        self.changed = asyncio.Condition()
+        self.sockets = set()
+
+    async def apply(self, delta: dict[str, Any]) -> None:
+        """Merge delta into the state and push it to listeners."""
+        deep_merge(self.state, delta)
+        self.seq += 1
+        async with self.changed:
+            self.changed.notify_all()
+        for ws in list(self.sockets):
+            try:
+                await ws.send_json({"type": "delta", "data": delta})
+            except ConnectionError:
+                # client went away, its handler has not noticed it yet
+                self.sockets.discard(ws)
+
+    def mutation(self, ratio: float) -> dict[str, Any]:
+        """Return delta changing values of some entities."""
+        if self.children:
+            delta = {n: c.mutation(ratio) for n, c in self.children.items()}
+            return {n: d for n, d in delta.items() if d}
+        delta = {}
+        for key, tbl in self.state.items():
+            if random.random() < ratio and (d := mutateEntity(tbl)) is not None:
+                delta[key] = d
+        return delta
+
+    async def getInfo(self, request: web.Request) -> web.Response:  # noqa: D102
+        return encodeResponse(request, self.info)
+
+    async def getSpec(self, _: web.Request) -> web.Response:  # noqa: D102
+        return web.Response(
+            body=self.specBlob, content_type="application/octet-stream"
+        )
+
+    async def getHub(self, request: web.Request) -> web.Response:  # noqa: D102
+        return encodeResponse(
+            request,
+            {n: {"info": c.info, "spec": c.spec} for n, c in self.children.items()},
+        )
+
+    async def getData(self, request: web.Request) -> web.Response:  # noqa: D102
+        if keys := request.query.get("keys"):
+            data: dict[str, Any] = {}
+            for k in keys.split(","):
+                kp = KeyPath(k)
+                if (v := kp.get(self.state)) is not None:
+                    deep_merge(data, kp.delta(v))
+            return encodeResponse(request, data)
+        wait = int(request.query.get("wait", 0))
+        if wait and request.query.get("since") == str(self.seq):
+            # long-poll, hold the request until data changes or wait expires
+            async with self.changed:
+                try:
+                    await asyncio.wait_for(self.changed.wait(), wait)
+                except TimeoutError:
+                    return web.Response(status=304, headers={"X-Seq": str(self.seq)})
+        return encodeResponse(request, self.state, **{"X-Seq": str(self.seq)})
 
-    def handle(self):  # noqa: D102
+    async def postData(self, request: web.Request) -> web.Response:  # noqa: D102
+        delta = await decodeRequest(request)
+        if child := request.match_info.get("child"):
+            if child not in self.children:
+                return web.Response(status=404)
+            delta = {child: delta}
+        logging.info("%s POST %s", self.name, json.dumps(delta))
+        await self.apply(delta)
+        return web.Response()
+
+    async def websocket(  # noqa: D102
+        self, request: web.Request
+    ) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self.sockets.add(ws)
+        logging.info("%s websocket connected", self.name)
         try:
-            self.raw_requestline = self.rfile.readline(65537)
-            if len(self.raw_requestline) > 65536:
-                self.requestline = ""
-                self.request_version = ""
-                self.command = ""
-                self.send_error(HTTPStatus.REQUEST_URI_TOO_LONG)
-                return
-            if not self.raw_requestline:
-                self.close_connection = True
-                return
-            if not self.parse_request():
-                # An error code has been sent, just exit
-                return
-            self.doAny()
-            self.wfile.flush()
-        except TimeoutError as e:
-            # a read or a write timed out.  Discard this connection
-            self.log_error("Request timed out: %r", e)
-            return
+            await ws.send_json({"type": "data", "data": self.state})
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    break
+                m = msg.json()
+                if m.get("type") == "post":
+                    delta = m["data"]
+                    if child := m.get("child"):
+                        if child not in self.children:
+                            await ws.send_json(
+                                {"type": "ack", "id": m["id"], "status": 404}
+                            )
+                            continue
+                        delta = {child: delta}
+                    logging.info("%s WS POST %s", self.name, json.dumps(delta))
+                    await ws.send_json({"type": "ack", "id": m["id"], "status": 200})
+                    await self.apply(delta)
+        finally:
+            self.sockets.discard(ws)
+            logging.info("%s websocket closed", self.name)
+        return ws
 
+    def routes(self, prefix: str) -> list[web.RouteDef]:  # noqa: D102
+        return [
+            web.get(f"{prefix}/info", self.getInfo),
+            web.get(f"{prefix}/spec", self.getSpec),
+            web.get(f"{prefix}/hub", self.getHub),
+            web.get(f"{prefix}/data", self.getData),
+            web.post(f"{prefix}/data", self.postData),
+            web.post(f"{prefix}/hub/{{child}}/data", self.postData),
+            web.get(f"{prefix}/ws", self.websocket),
+        ]
 
-if __name__ == "__main__":
-    webServer = HTTPServer((hostName, serverPort), MyServer)
-    logging.info("Server started http://%s:%s", hostName, serverPort)
+
+def newBehavior(args: argparse.Namespace) -> Any:
+    """Middleware simulating slow and unreliable devices."""
+
+    @web.middleware
+    async def behavior(request: web.Request, handler: Any) -> web.StreamResponse:
+        delay = args.latency + random.uniform(-args.jitter, args.jitter)
+        await asyncio.sleep(max(delay, 0) / 1000)
+        if random.random() < args.timeout_rate:
+            # never answers, client times out
+            await asyncio.sleep(3600)
+        if random.random() < args.fail_rate:
+            return web.Response(status=500, text="simulated failure")
+        return await handler(request)
+
+    return behavior
+
+
+async def mutate(devices: list[VirtualDevice], period: float, ratio: float) -> None:
+    """Change values of some entities of all devices, every period seconds."""
+    while True:
+        await asyncio.sleep(period)
+        for d in devices:
+            if delta := d.mutation(ratio):
+                await d.apply(delta)
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """Start all virtual devices and run until cancelled."""
+    devices = [
+        VirtualDevice(f"dev{i}", args.entities, args.children)
+        for i in range(args.devices)
+    ]
+    runners: list[web.AppRunner] = []
+    if args.layout == "prefix":
+        app = web.Application(middlewares=[newBehavior(args)])
+        for d in devices:
+            app.add_routes(d.routes(f"/{d.name}/api"))
+        apps = [(app, args.port)]
+    else:
+        apps = []
+        for i, d in enumerate(devices):
+            app = web.Application(middlewares=[newBehavior(args)])
+            app.add_routes(d.routes("/api"))
+            apps.append((app, args.port + i))
+    for app, port in apps:
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, args.host, port).start()
+        runners.append(runner)
+
+    first = devices[0].name if args.layout == "prefix" else ""
+    logging.warning(
+        "Serving %d devices, first at http://%s:%d%s/api",
+        len(devices),
+        args.host,
+        args.port,
+        f"/{first}" if first else "",
+    )
+    try:
+        if args.mutate > 0:
+            await mutate(devices, args.mutate, args.mutate_ratio)
+        else:
+            await asyncio.Event().wait()
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+def compare(entities: int) -> None:
+    """Print size and decode time of the device payloads in each encoding."""
+    d = VirtualDevice("dev0", entities)
+    for name, data in (("spec", d.spec), ("data", d.state)):
+        for mime, (enc, dec) in codecs.items():
+            dt = enc(data)
+            n = 2000
+            t = timeit.timeit(lambda: dec(dt), number=n) / n * 1e6  # noqa: B023
+            print(f"{name:<5} {mime:<20} {len(dt):7d} bytes {t:8.1f} us/decode")
+
+
+def main() -> None:  # noqa: D103
+    parser = argparse.ArgumentParser(description="NodeMCU devices simulator")
+    parser.add_argument("--host", default=hostName)
+    parser.add_argument("--port", type=int, default=serverPort)
+    parser.add_argument("--devices", type=int, default=1)
+    parser.add_argument(
+        "--layout",
+        choices=["ports", "prefix"],
+        default="ports",
+        help="device per port, or all devices on one port under /dev<i>/api",
+    )
+    parser.add_argument(
+        "--entities", type=int, default=0, help="synthetic entities, 0=test_data"
+    )
+    parser.add_argument(
+        "--children", type=int, default=0, help="make each device a hub"
+    )
+    parser.add_argument("--latency", type=float, default=0, help="ms")
+    parser.add_argument("--jitter", type=float, default=0, help="ms")
+    parser.add_argument("--fail-rate", type=float, default=0)
+    parser.add_argument("--timeout-rate", type=float, default=0)
+    parser.add_argument("--mutate", type=float, default=5, help="s, 0=off")
+    parser.add_argument("--mutate-ratio", type=float, default=0.1)
+    parser.add_argument("--compare", action="store_true")
+    parser.add_argument("-v", "--verbose", action="store_true")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    if args.compare:
+        compare(args.entities)
+        return
 
     from contextlib import suppress
 
     with suppress(KeyboardInterrupt):
-        webServer.serve_forever()
+        asyncio.run(serve(args))
 
-    webServer.server_close()
-    logging.info("Server stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,14 @@
+"""Test fixtures of the nodemcu integration."""
+
+import importlib.util
+from pathlib import Path
+import sys
+
+# the repository is the integration package itself, import it as "nodemcu"
+_root = Path(__file__).parent.parent
+if "nodemcu" not in sys.modules:
+    _spec = importlib.util.spec_from_file_location(
+        "nodemcu", _root / "__init__.py", submodule_search_locations=[str(_root)]
+    )
+    assert _spec is not None
+    sys.modules["nodemcu"] = importlib.util.module_from_spec(_spec)
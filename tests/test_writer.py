@@ -0,0 +1,67 @@
+"""Tests of the per-device write batcher."""
+
+import asyncio
+from types import SimpleNamespace
+from typing import Any
+from unittest.mock import patch
+
+from nodemcu.utils import KeyPath
+from nodemcu.writer import NMWriteBatcher
+
+
+def _batcher() -> NMWriteBatcher:
+    """Return batcher with stubbed hass, sending after 10ms window."""
+
+    async def _onWritten() -> None:
+        pass
+
+    hass: Any = SimpleNamespace(
+        loop=asyncio.get_running_loop(), async_create_task=asyncio.create_task
+    )
+    conn: Any = SimpleNamespace()
+    return NMWriteBatcher(hass, conn, 0.01, _onWritten)
+
+
+def test_superseding_write_wins_per_field() -> None:
+    """Newer write of a field wins, fields it does not carry are kept."""
+    sent: list[dict[str, Any]] = []
+
+    async def _update(conn: Any, data: dict[str, Any]) -> None:
+        sent.append(data)
+
+    async def _run() -> None:
+        batcher = _batcher()
+        key = KeyPath("light1")
+        color = {"r": 1, "g": 2}
+        first = {"is_on": True, "brightness": 200, "rgb": color}
+        await asyncio.gather(
+            batcher.async_write(key, first),
+            batcher.async_write(key, {"is_on": False, "rgb": {"r": 9}}),
+        )
+        assert first == {"is_on": True, "brightness": 200, "rgb": {"r": 1, "g": 2}}
+
+    with patch("nodemcu.writer.update_device_data", _update):
+        asyncio.run(_run())
+
+    assert sent == [{"light1": {"is_on": False, "brightness": 200, "rgb": {"r": 9}}}]
+
+
+def test_superseding_keeps_other_keys_apart() -> None:
+    """Writes of different keys are batched, each with its own latest fields."""
+    sent: list[dict[str, Any]] = []
+
+    async def _update(conn: Any, data: dict[str, Any]) -> None:
+        sent.append(data)
+
+    async def _run() -> None:
+        batcher = _batcher()
+        await asyncio.gather(
+            batcher.async_write(KeyPath("a.x"), {"v": 1}),
+            batcher.async_write(KeyPath("a.y"), {"v": 2}),
+            batcher.async_write(KeyPath("a.x"), {"v": 3}),
+        )
+
+    with patch("nodemcu.writer.update_device_data", _update):
+        asyncio.run(_run())
+
+    assert sent == [{"a": {"x": {"v": 3}, "y": {"v": 2}}}]
@@ -0,0 +1,108 @@
+"""Latency probing of a device, recommending its polling period and timeouts."""
+
+import math
+from statistics import median
+import time
+from typing import Any, Final
+
+from .const import (
+    CONF_PERIOD,
+    CONF_TIMEOUT_CONNECT,
+    CONF_TIMEOUT_READ,
+    DEFAULT_PERIOD_MAX,
+    DEFAULT_PERIOD_MIN,
+)
+from .mediation import (
+    NMConnection,
+    NMTransferStats,
+    read_device_data,
+    read_device_info,
+)
+
+# round-trips of each endpoint done by a probe
+PROBE_ROUNDS: Final = 3
+# share of time the device may spend answering polls, it serves one request at a time
+PERIOD_DUTY: Final = 0.01
+# timeouts are the slowest measured round-trip times this factor, within bounds
+TIMEOUT_FACTOR: Final = 4
+TIMEOUT_MIN: Final = 2
+TIMEOUT_MAX: Final = 60
+
+
+class NMProbeResult:
+    """Round-trip times and payload sizes measured by a probe."""
+
+    # seconds of each round-trip, first /info includes connecting to the device
+    info_latency: list[float]
+    data_latency: list[float]
+    # bytes of the largest /data answer, as received over the wire and decompressed
+    data_wire_bytes: int
+    data_body_bytes: int
+
+    def __init__(self) -> None:
+        """Initialize empty result."""
+        self.info_latency = []
+        self.data_latency = []
+        self.data_wire_bytes = 0
+        self.data_body_bytes = 0
+
+
+async def probe_device(conn: NMConnection, rounds: int = PROBE_ROUNDS) -> NMProbeResult:
+    """Time rounds of GET /info and GET /data of a fresh connection.
+
+    Raises CannotConnect and InvalidAuth as the requests do.
+    """
+    result = NMProbeResult()
+    for _ in range(rounds):
+        start = time.monotonic()
+        await read_device_info(conn)
+        result.info_latency.append(time.monotonic() - start)
+    for _ in range(rounds):
+        stats = conn.transfer_stats.get("/data", NMTransferStats())
+        wire, body = stats.wire_bytes, stats.body_bytes
+        start = time.monotonic()
+        await read_device_data(conn)
+        result.data_latency.append(time.monotonic() - start)
+        stats = conn.transfer_stats.get("/data", NMTransferStats())
+        result.data_wire_bytes = max(result.data_wire_bytes, stats.wire_bytes - wire)
+        result.data_body_bytes = max(result.data_body_bytes, stats.body_bytes - body)
+    return result
+
+
+def _clamp(v: float, low: float, high: float) -> int:
+    return int(min(max(math.ceil(v), low), high))
+
+
+def recommend(result: NMProbeResult) -> dict[str, Any]:
+    """Return polling period and timeouts suiting the measured device.
+
+    Period keeps the device busy answering polls at most PERIOD_DUTY of
+    the time. Connect timeout follows the first round-trip, which includes
+    connecting, read timeout the slowest /data round-trip.
+    """
+    return {
+        CONF_PERIOD: _clamp(
+            median(result.data_latency) / PERIOD_DUTY,
+            DEFAULT_PERIOD_MIN,
+            DEFAULT_PERIOD_MAX,
+        ),
+        CONF_TIMEOUT_CONNECT: _clamp(
+            result.info_latency[0] * TIMEOUT_FACTOR, TIMEOUT_MIN, TIMEOUT_MAX
+        ),
+        CONF_TIMEOUT_READ: _clamp(
+            max(result.data_latency) * TIMEOUT_FACTOR, TIMEOUT_MIN, TIMEOUT_MAX
+        ),
+    }
+
+
+def describe(result: NMProbeResult) -> str:
+    """Return one line summary of the measurements, for forms and logs."""
+
+    def ms(samples: list[float]) -> str:
+        return f"{median(samples) * 1000:.0f}/{max(samples) * 1000:.0f} ms"
+
+    return (
+        f"/info {ms(result.info_latency)}, /data {ms(result.data_latency)}"
+        f" (median/max), /data {result.data_body_bytes} bytes"
+        f" ({result.data_wire_bytes} on wire)"
+    )
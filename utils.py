@@ -1,6 +1,9 @@
 """The module provides utility functions for NodeMCU components."""
 
+from collections.abc import Callable, Mapping
 from enum import IntFlag
+from functools import lru_cache
+import re
 from typing import Any, TypeVar
 
 T = TypeVar("T")
@@ -8,16 +11,78 @@ T = TypeVar("T")
 ET = TypeVar("ET", bound=IntFlag)
 
 
-def dict_to_attr(obj: T, data: dict[str, Any]) -> T:  # noqa: D103
-    for k, v in data.items():
-        attr_name = f"_attr_{k}"
-        if hasattr(obj, attr_name):
-            if isinstance(getattr(obj, attr_name), tuple):
-                v = {"__tuple__": True, "items": v}
-        setattr(obj, k, v)
+def dict_to_attr(
+    obj: T, data: dict[str, Any], enums: Mapping[str, type[IntFlag]] | None = None
+) -> T:
+    """Set data values as obj attributes, see AttrMapper.
+
+    enums lists attributes to convert from int to given IntFlag type,
+    it is expected to be the same for all objects of the same class.
+    """
+    mapperKey = (type(obj), tuple(data))
+    mapper = _mappers.get(mapperKey)
+    if mapper is None:
+        if len(_mappers) >= _MAPPERS_MAX:
+            # drop the oldest, devices sending ever new key sets must not grow it
+            del _mappers[next(iter(_mappers))]
+        mapper = _mappers[mapperKey] = AttrMapper(obj, mapperKey[1], enums or {})
+    mapper.apply(obj, data)
     return obj
 
 
+def _asTuple(v: Any) -> Any:
+    return {"__tuple__": True, "items": v}
+
+
+class AttrMapper:
+    """Sets attributes from data with given keys, compiled once per class and keys.
+
+    Which attributes need tuple or enum conversion and which cannot be set
+    (read-only properties, ignored) is resolved once, instead of inspecting
+    the object for each key of each update.
+    """
+
+    __slots__ = ("_setters",)
+
+    # (key, conversion of its value or None)
+    _setters: tuple[tuple[str, Callable[[Any], Any] | None], ...]
+
+    def __init__(
+        self, obj: Any, keys: tuple[str, ...], enums: Mapping[str, type[IntFlag]]
+    ) -> None:
+        """Compile the mapper, obj is a sample object of the class."""
+        setters: list[tuple[str, Callable[[Any], Any] | None]] = []
+        for k in keys:
+            classAttr = getattr(type(obj), k, None)
+            if isinstance(classAttr, property) and classAttr.fset is None:
+                continue
+            conv: Callable[[Any], Any] | None = None
+            if (enum := enums.get(k)) is not None:
+                conv = _enumConverter(enum)
+            elif isinstance(getattr(obj, f"_attr_{k}", None), tuple):
+                conv = _asTuple
+            setters.append((k, conv))
+        self._setters = tuple(setters)
+
+    def apply(self, obj: Any, data: dict[str, Any]) -> None:
+        """Set values of data, which must have the keys the mapper was compiled for."""
+        for k, conv in self._setters:
+            v = data[k]
+            setattr(obj, k, v if conv is None else conv(v))
+
+
+# compiled mappers per (class, data keys), in order of compilation
+_mappers: dict[tuple[type, tuple[str, ...]], AttrMapper] = {}
+_MAPPERS_MAX = 512
+
+
+def _enumConverter(enum: type[ET]) -> Callable[[Any], ET | None]:
+    def conv(v: Any) -> ET | None:
+        return None if v is None else int_to_enum(v, enum)
+
+    return conv
+
+
 def deep_get(d: dict[str, Any], key: str, default: Any | None = None) -> Any | None:
     """Get safely a nested value from a dict, useful to get deep values from json data."""
 
@@ -40,6 +105,11 @@ def deep_get(d: dict[str, Any], key: str, default: Any | None = None) -> Any | N
         return d
 
 
+def escape_key(key: str) -> str:
+    """Escape KeyPath special characters, making the key single path segment."""
+    return re.sub(r"([\\.\[])", r"\\\1", key)
+
+
 def deepdict(key: str, lastValue: Any) -> dict[str, Any]:
     """Take key in (optionally path with .) and returns deep dict with last key=lastValue."""
     arr = key.split(".", 1)
@@ -48,10 +118,157 @@ def deepdict(key: str, lastValue: Any) -> dict[str, Any]:
     return {arr[0]: deepdict(arr[1], lastValue)}
 
 
-def int_to_enum(integer_value: int, enums: type[ET]) -> ET:
-    """Convert integer to Enum."""
+def _parse_key(key: str) -> tuple[str | int, ...]:
+    """Split key into path segments.
+
+    "." separates dict keys, "[n]" is list index, "\\" escapes next character.
+    """
+    segments: list[str | int] = []
+    buf: list[str] = []
+    pending = True  # a dict key segment is open, even if empty
+    i = 0
+    while i < len(key):
+        ch = key[i]
+        if ch == "\\":
+            if i + 1 == len(key):
+                raise ValueError(f"dangling escape in key: {key}")
+            buf.append(key[i + 1])
+            pending = True
+            i += 2
+            continue
+        if ch == ".":
+            if pending:
+                segments.append("".join(buf))
+            buf = []
+            pending = True
+        elif ch == "[":
+            end = key.find("]", i)
+            if end < 0 or not key[i + 1 : end].isdigit():
+                raise ValueError(f"invalid list index in key: {key}")
+            if buf:
+                segments.append("".join(buf))
+            buf = []
+            segments.append(int(key[i + 1 : end]))
+            pending = False
+            i = end
+        else:
+            buf.append(ch)
+            pending = True
+        i += 1
+    if pending:
+        segments.append("".join(buf))
+    return tuple(segments)
+
+
+class KeyPath:
+    """Compiled entity key, pointing to entity's data inside DeviceData.
+
+    Build it once per entity and use it for reads and for write deltas.
+    Besides "parent.child" notation it supports list indices "pins[3].value"
+    and escaping of special characters with backslash "a\\.b".
+    """
+
+    __slots__ = ("key", "segments")
+
+    key: str
+    segments: tuple[str | int, ...]
+
+    def __init__(self, key: str) -> None:
+        """Compile the key."""
+        self.key = key
+        self.segments = _parse_key(key)
+
+    def get(self, d: Any, default: Any | None = None) -> Any | None:
+        """Get safely the value from json data, same semantic as deep_get."""
+        try:
+            for k in self.segments:
+                d = d[k]
+        except (KeyError, IndexError):
+            return default
+        except TypeError:
+            if d is None:
+                return default
+            raise
+        return d
+
+    def delta(self, lastValue: Any) -> dict[Any, Any]:
+        """Build deep dict with lastValue at the end of the path, same as deepdict.
+
+        List indices become object keys, as json serialized i.e. {"pins": {"3": ...}}.
+        """
+        for k in reversed(self.segments):
+            lastValue = {k: lastValue}
+        return lastValue
+
+    def merged(self, d: Any, payload: dict[str, Any]) -> Any:
+        """Return copy of json data with payload merged into the value at the path.
+
+        Only containers along the path are copied, the rest is shared with d.
+        """
+        return self._copied(d, 0, lambda v: deep_merged(v, payload))
+
+    def replaced(self, d: Any, value: Any) -> Any:
+        """Return copy of json data with the value at the path replaced.
+
+        Only containers along the path are copied, the rest is shared with d.
+        """
+        return self._copied(d, 0, lambda _: value)
+
+    def _copied(self, d: Any, i: int, leaf: Callable[[Any], Any]) -> Any:
+        if i == len(self.segments):
+            return leaf(d)
+        k = self.segments[i]
+        if isinstance(d, list) and isinstance(k, int) and k < len(d):
+            ret = list(d)
+            ret[k] = self._copied(d[k], i + 1, leaf)
+            return ret
+        ret = {**d} if isinstance(d, dict) else {}
+        ret[k] = self._copied(ret.get(k), i + 1, leaf)
+        return ret
+
+    def __eq__(self, other: object) -> bool:  # noqa: D105
+        return isinstance(other, KeyPath) and other.segments == self.segments
+
+    def __hash__(self) -> int:  # noqa: D105
+        return hash(self.segments)
+
+    def __repr__(self) -> str:  # noqa: D105
+        return f"KeyPath({self.key!r})"
+
+
+def deep_merge(dst: dict[Any, Any], src: dict[Any, Any]) -> dict[Any, Any]:
+    """Merge recursively src into dst, src values win. Returns dst."""
+    for k, v in src.items():
+        if isinstance(v, dict) and isinstance(dst.get(k), dict):
+            deep_merge(dst[k], v)
+        else:
+            dst[k] = v
+    return dst
+
+
+def deep_merged(dst: Any, src: dict[Any, Any]) -> dict[Any, Any]:
+    """Return new dict with src merged recursively over dst, dst is not modified."""
+    ret = {**dst} if isinstance(dst, dict) else {}
+    for k, v in src.items():
+        ret[k] = deep_merged(ret.get(k), v) if isinstance(v, dict) else v
+    return ret
+
+
+def _intToEnum(integer_value: int, enums: type[ET]) -> ET:
     ret = 0
     for flag in enums:
         if integer_value & flag.value:
             ret = flag | ret
     return ret
+
+
+# memoized as devices repeat the same few values
+_cachedIntToEnum = lru_cache(maxsize=1024)(_intToEnum)
+
+
+def int_to_enum(integer_value: int, enums: type[ET]) -> ET:
+    """Convert integer to Enum, memoized for int values."""
+    if isinstance(integer_value, int):
+        return _cachedIntToEnum(integer_value, enums)
+    # not hashable or not an int, converted without the cache
+    return _intToEnum(integer_value, enums)
@@ -0,0 +1,134 @@
+"""Per-device writer, coalescing concurrent entity writes into single POST /data."""
+
+import asyncio
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+
+from .const import NodeMCUDeviceException
+from .mediation import NMConnection, update_device_data
+from .utils import KeyPath, deep_merged
+
+# entity's pending payload, with the futures of all writers it carries
+_PendingWrite = tuple[dict[str, Any], list[asyncio.Future[None]]]
+
+
+class NMWriteBatcher:
+    """Collect writes arriving within short window and send them as one request.
+
+    A scene turning on several lights of the same device results in single
+    POST /data carrying all deltas and single data refresh afterwards.
+    Each writer awaits the outcome of the request carrying its delta.
+
+    Writes to the same entity key, arriving while previous request is still
+    in flight, are collapsed field by field: the newest write of each top-level
+    payload field wins, fields the newer write does not carry are still sent.
+    Bursts like dragging a brightness slider send only the newest value once
+    the device is free.
+    """
+
+    hass: HomeAssistant
+    conn: NMConnection
+
+    # seconds to wait for more writes before sending the batch
+    window: float
+    # called once after each sent batch, typically requests data refresh
+    on_written: Callable[[], Awaitable[None]]
+
+    # payloads waiting to be sent, per entity key
+    _pending: dict[KeyPath, _PendingWrite]
+    # if any pending write asked for data refresh after sending
+    _refresh: bool
+    # the scheduled flush task, None if nothing is pending
+    _flushTask: asyncio.Task[None] | None
+    # ensures one POST in flight at a time, device handles them serially anyway
+    _lock: asyncio.Lock
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        conn: NMConnection,
+        window: float,
+        on_written: Callable[[], Awaitable[None]],
+    ) -> None:
+        """Initialize the batcher."""
+        self.hass = hass
+        self.conn = conn
+        self.window = window
+        self.on_written = on_written
+        self._pending = {}
+        self._refresh = False
+        self._flushTask = None
+        self._lock = asyncio.Lock()
+
+    async def async_write(
+        self, key: KeyPath, payload: dict[str, Any], refresh: bool = True
+    ) -> None:
+        """Queue entity's payload for sending and wait until the device accepted it.
+
+        Fields of payload still pending for the same key are replaced by the new ones.
+        The batch is followed by on_written() if any of its writes asked to refresh.
+        """
+        fut: asyncio.Future[None] = self.hass.loop.create_future()
+        self._refresh = self._refresh or refresh
+        if (pending := self._pending.get(key)) is not None:
+            # newest value of each field wins, nested values are not merged
+            pending[0].update(payload)
+            pending[1].append(fut)
+        else:
+            self._pending[key] = ({**payload}, [fut])
+        if self._flushTask is None:
+            self._flushTask = self.hass.async_create_task(self._async_flush())
+        await fut
+
+    async def _async_flush(self) -> None:
+        """Wait for the window and the in-flight request, then send what is pending.
+
+        Batch is taken only once the device is free, so writes arriving
+        in the meantime can still supersede each other.
+        """
+        await asyncio.sleep(self.window)
+        async with self._lock:
+            batch, self._pending = self._pending, {}
+            refresh, self._refresh = self._refresh, False
+            self._flushTask = None
+            await self._async_send(list(batch.items()))
+        if refresh:
+            await self.on_written()
+
+    async def _async_send(self, batch: list[tuple[KeyPath, _PendingWrite]]) -> None:
+        """Send the batch as one request, resolving writers' futures."""
+        # copy-on-write merge, pending payloads and their nested values stay intact
+        # for the one by one resend
+        data: dict[str, Any] = {}
+        for key, (payload, _) in batch:
+            data = deep_merged(data, key.delta(payload))
+        try:
+            await update_device_data(self.conn, data)
+        except NodeMCUDeviceException as ex:
+            if len(batch) == 1:
+                _setOutcome(batch[0][1][1], ex)
+                return
+            # device rejected the merged payload, resend one by one
+            # to report the error only to the writers actually causing it
+            for item in batch:
+                await self._async_send([item])
+            return
+        except Exception as ex:  # pylint: disable=broad-except
+            for _, (_, futs) in batch:
+                _setOutcome(futs, ex)
+            return
+        for _, (_, futs) in batch:
+            _setOutcome(futs, None)
+
+
+def _setOutcome(futs: list[asyncio.Future[None]], ex: Exception | None) -> None:
+    """Resolve writers' futures, unless a writer has given up already."""
+    for fut in futs:
+        if fut.done():
+            continue
+        if ex is None:
+            fut.set_result(None)
+        else:
+            fut.set_exception(ex)